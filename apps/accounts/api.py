@@ -2,6 +2,8 @@ from typing import Any
 
 from django.contrib.auth import authenticate
 from django.db import IntegrityError
+from django.db.models import QuerySet
+from django.http import HttpResponse
 from ninja import Router
 from ninja.errors import AuthorizationError
 
@@ -18,12 +20,19 @@ from accounts.schemas import (
     UserPartialUpdateInSchema,
     UserPartialUpdateOutSchema,
 )
-from helpers.exceptions import clean_integrity_error, get_or_404
-from helpers.jwt_utils import AuthedRequest, TokenAuth, create_jwt_token
+from accounts.viewer import aget_viewer
+from helpers.conditional import make_etag, not_modified
+from helpers.exceptions import aget_or_404, clean_integrity_error, get_or_404
+from helpers.jwt_utils import AsyncTokenAuth, AuthedRequest, TokenAuth, create_jwt_token
+from helpers.projection import project
 
 router = Router()
 
 
+def _profiles() -> QuerySet:
+    return project(User.objects.all(), ProfileSchema)
+
+
 @router.post("/users", response={201: Any, 400: Any, 409: Any})
 def account_registration(request, data: UserCreateSchema) -> tuple[int, dict[str, Any]]:
     try:
@@ -69,31 +78,39 @@ def get_user(request: AuthedRequest) -> UserGetSchema:
 @router.put("/user", auth=TokenAuth(), response={200: Any, 401: Any})
 def put_user(request: AuthedRequest, data: UserPartialUpdateInSchema) -> UserPartialUpdateOutSchema:
     """This is wrong, but this method behaves like a PATCH, as required by the RealWorld API spec"""
+    updated_fields = []  # Only these are saved, not to overwrite the counters that `articles.timeline` keeps
     for word in ("email", "bio", "image", "username"):
         value = getattr(data.user, word)
         if value != EMPTY:
             setattr(request.user, word, value)
+            updated_fields.append(word)
     if data.user.password != EMPTY:
         request.user.set_password(data.user.password)
-    request.user.save()
+        updated_fields.append("password")
+    request.user.save(update_fields=updated_fields)
     token = create_jwt_token(request.user)
     return UserPartialUpdateOutSchema.model_construct(
         user=UserInPartialUpdateOutSchema.from_orm(request.user, context={"token": token}),
     )
 
 
-@router.get("/profiles/{username}", auth=TokenAuth(pass_even=True), response={200: Any, 401: Any, 404: Any})
-def get_profile(request, username: str) -> ProfileOutSchema:
-    return ProfileOutSchema.model_construct(
-        profile=ProfileSchema.from_orm(get_or_404(User, "profile", username=username), context={"request": request})
-    )
+@router.get("/profiles/{username}", auth=AsyncTokenAuth(pass_even=True), response={200: Any, 401: Any, 404: Any})
+async def get_profile(request, username: str, response: HttpResponse) -> ProfileOutSchema | HttpResponse:
+    """Conditional GET, with an ETag only as nothing timestamps profile changes"""
+    profile = await aget_or_404(_profiles(), "profile", username=username)
+    viewer = await aget_viewer(request)
+    await viewer.aload_page(author_ids=[profile.id])
+    etag = make_etag(profile.username, profile.bio, profile.image, viewer.follows(profile.id))
+    if unchanged := not_modified(request, response, etag):
+        return unchanged
+    return ProfileOutSchema.model_construct(profile=ProfileSchema.from_orm(profile, context={"request": request}))
 
 
 @router.post(
     "/profiles/{username}/follow", auth=TokenAuth(), response={200: Any, 400: Any, 403: Any, 404: Any, 409: Any}
 )
 def follow_profile(request: AuthedRequest, username: str) -> tuple[int, None] | ProfileOutSchema:
-    profile = get_or_404(User, "profile", username=username)
+    profile = get_or_404(_profiles(), "profile", username=username)
     if profile == request.user:
         raise AuthorizationError
     if profile.followers.filter(pk=request.user.id).exists():
@@ -106,7 +123,7 @@ def follow_profile(request: AuthedRequest, username: str) -> tuple[int, None] |
     "/profiles/{username}/follow", auth=TokenAuth(), response={200: Any, 400: Any, 403: Any, 404: Any, 409: Any}
 )
 def unfollow_profile(request: AuthedRequest, username: str) -> tuple[int, None] | ProfileOutSchema:
-    profile = get_or_404(User, "profile", username=username)
+    profile = get_or_404(_profiles(), "profile", username=username)
     if profile == request.user:
         raise AuthorizationError
     if not profile.followers.filter(pk=request.user.id).exists():
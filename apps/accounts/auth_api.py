@@ -0,0 +1,22 @@
+"""
+Routes of `jwt_ninja.api` wrapped to keep the auth cache of `helpers.jwt_utils` right, mounted before its router so that
+they take precedence. `logout/all/` revokes the sessions with `QuerySet.update`, which sends no signal for
+`accounts.signals` to forget them.
+"""
+
+from django.http import HttpResponse
+from jwt_ninja import api as jwt_api
+from jwt_ninja.auth_classes import AuthedRequest, JWTAuth
+from ninja import Router
+
+from helpers.jwt_utils import forget_sessions
+
+router = Router(tags=["Authentication"])
+
+
+@router.post("logout/all/", summary="Logout from all sessions", response={200: None}, auth=JWTAuth())
+def logout_all(request: AuthedRequest) -> HttpResponse:
+    session_ids = list(request.auth.user.jwt_sessions.active().values_list("id", flat=True))
+    response = jwt_api.logout_all(request)
+    forget_sessions(*session_ids)
+    return response
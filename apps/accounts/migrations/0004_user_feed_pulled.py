@@ -0,0 +1,37 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:02
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def flag_pulled_authors(apps, schema_editor):
+    """Flag the authors past the fan-out maximum, and count them for their followers, as `articles.timeline` would."""
+    User = apps.get_model("accounts", "User")
+    Follow = User.followers.through
+    authors = Follow.objects.values("from_user_id").annotate(n=Count("id")).order_by()
+    pulled = authors.filter(n__gt=settings.FEED_FANOUT_MAX_FOLLOWERS).values("from_user_id")
+    User.objects.filter(id__in=pulled).update(feed_pulled=True)
+    follows = Follow.objects.filter(to_user_id=OuterRef("pk"), from_user__feed_pulled=True).values("to_user_id")
+    User.objects.update(pulled_follows=Coalesce(Subquery(follows.annotate(n=Count("id")).values("n")), 0))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0003_alter_user_username"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="feed_pulled",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="pulled_follows",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(flag_pulled_authors, migrations.RunPython.noop),
+    ]
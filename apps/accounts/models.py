@@ -37,6 +37,10 @@ class User(AbstractUser):
     image = models.URLField(null=True, blank=True)
 
     followers = models.ManyToManyField("self", blank=True, symmetrical=False)
+    # Kept by `articles.timeline`: whether this author has too many followers for their articles to be pushed to the
+    # feeds, and how many of these authors this user follows, never less, so that feeds only look for them if needed
+    feed_pulled = models.BooleanField(default=False, editable=False)
+    pulled_follows = models.PositiveIntegerField(default=0, editable=False)
 
     EMAIL_FIELD = "email"
     USERNAME_FIELD = "email"
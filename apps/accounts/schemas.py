@@ -1,12 +1,15 @@
 from __future__ import annotations
 
-from typing import Annotated, Any
+from typing import Annotated, Any, Self
 
+from django.http import HttpRequest
 from ninja import ModelSchema, Schema
 from pydantic import AfterValidator, EmailStr, ValidationInfo, field_validator
 
 from accounts.models import User
+from accounts.viewer import get_viewer
 from helpers.empty import EMPTY, _Empty
+from helpers.loaders import request_from
 
 
 def none_to_blank(v: str | None, info: ValidationInfo) -> str:
@@ -30,8 +33,8 @@ class ProfileSchema(ModelSchema):
             return bool(obj.following)  # bool() needed - Django's Exists(), dynamically attached by annotation
         if isinstance(obj, ProfileSchema):  # re-validating an already-constructed schema
             return obj.following  # return existing bool
-        user = getattr(context.get("request") if context else None, "user", None)  # fallback: compute through db query
-        return obj.followers.filter(pk=user.id).exists() if user and user.is_authenticated else False
+        request = request_from(context)  # fallback: set lookup, loaded by the view for the whole page
+        return get_viewer(request).follows(obj.id) if request else False
 
     @field_validator("bio", mode="before")
     @classmethod
@@ -43,6 +46,30 @@ class ProfileSchema(ModelSchema):
     def default_image(cls, v: str | None) -> str | None:
         return v or None
 
+    @classmethod
+    def from_trusted(cls, obj: User, request: HttpRequest) -> Self:
+        """What `from_orm` would output for a user loaded by the view, without validating it"""
+        following = bool(obj.following) if hasattr(obj, "following") else get_viewer(request).follows(obj.id)
+        return cls.model_construct(
+            following=following, bio=obj.bio or None, image=obj.image or None, username=obj.username
+        )
+
+
+class AuthorSchema(ModelSchema):
+    """A profile as exported, without what relates it to a viewer"""
+
+    bio: str | None
+    image: str | None
+
+    class Meta:
+        model = User
+        fields = ["username"]
+
+    @field_validator("bio", "image", mode="before")
+    @classmethod
+    def empty_str_to_none(cls, v: str | None) -> str | None:
+        return v or None
+
 
 class ProfileOutSchema(Schema):
     profile: ProfileSchema
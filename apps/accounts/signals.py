@@ -0,0 +1,26 @@
+"""
+Signal handlers dropping the cached auth of the sessions whose session or user changed, so that a revoked session,
+a deactivated user or an updated profile take effect right away. Deleting a user deletes their sessions, which is
+handled as any session deletion.
+"""
+
+from typing import Any
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from jwt_ninja.models import Session
+
+from accounts.models import User
+from helpers.jwt_utils import forget_sessions, forget_users
+
+
+@receiver(post_save, sender=Session)
+@receiver(post_delete, sender=Session)
+def forget_changed_session(sender: type[Session], instance: Session, **kwargs: Any) -> None:
+    forget_sessions(instance.id)
+
+
+@receiver(post_save, sender=User)
+def forget_saved_user(sender: type[User], instance: User, created: bool, **kwargs: Any) -> None:
+    if not created:
+        forget_users([instance.id])
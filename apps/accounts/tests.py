@@ -1,15 +1,27 @@
+import time
+from datetime import timedelta
 from json import loads
 from unittest import mock
 
+from asgiref.sync import async_to_sync
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
 from django.db import transaction
-from django.test import TestCase
-from ninja.testing import TestClient
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from jwt_ninja.cryptography import decode_jwt, generate_jwt
+from jwt_ninja.errors import APIError, JWTExpiredError
+from jwt_ninja.models import Session
+from jwt_ninja.types import JWTPayload
 from parameterized import parameterized
 
 from accounts.api import router
-from helpers.jwt_utils import create_jwt_token
+from accounts.viewer import Viewer
+from helpers.jwt_utils import AsyncTokenAuth, AuthDetails, TokenAuth, create_jwt_token, decoded_tokens
+from helpers.revocations import revoked_sessions
+from helpers.testing import TestClient
 
 User = get_user_model()
 
@@ -43,6 +55,7 @@ class AccountRegistrationTestCase(TestCase):
                 "bio": "",
                 "date_joined": mock.ANY,
                 "email": "test@example.com",
+                "feed_pulled": False,
                 "id": mock.ANY,
                 "image": None,
                 "is_active": True,
@@ -50,6 +63,7 @@ class AccountRegistrationTestCase(TestCase):
                 "is_superuser": False,
                 "last_login": None,
                 "password": mock.ANY,
+                "pulled_follows": 0,
                 "username": "testuser",
             },
         )
@@ -172,7 +186,13 @@ class UserViewTestCase(TestCase):
             "image": "http://example.com/updated-image.jpg",
             "username": "UpdatedUsername",
         }
-        self.default_user_statuses = {"is_active": True, "is_staff": False, "is_superuser": False}
+        self.default_user_statuses = {
+            "is_active": True,
+            "is_staff": False,
+            "is_superuser": False,
+            "feed_pulled": False,
+            "pulled_follows": 0,
+        }
 
     def test_user_view_get(self):
         response = self.client.get(self.url)
@@ -354,6 +374,16 @@ class ProfileDetailViewTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(loads(response.content), {"profile": {**self.other_dict, "following": True}})
 
+    def test_profile_detail_view_get_not_modified(self):
+        etag = self.client.get(self.other_url)["ETag"]
+        with self.assertNumQueries(2):  # The profile, then the follow, the auth being cached
+            response = self.client.get(self.other_url, headers={"IF-NONE-MATCH": etag})
+        self.assertEqual(response.status_code, 304)
+        self.other_user.followers.add(self.user)
+        response = self.client.get(self.other_url, headers={"IF-NONE-MATCH": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(loads(response.content), {"profile": {**self.other_dict, "following": True}})
+
     def test_profile_detail_view_follow(self):
         response = self.client.post(f"{self.other_url}/follow")
         self.assertEqual(response.status_code, 200)
@@ -403,3 +433,198 @@ class ProfileDetailViewTestCase(TestCase):
             self.assertEqual(response.status_code, 404)
         except Exception as e:
             self.assertEqual(e.args[0], 'Cannot resolve "/profiles/testuser/follow/23"')
+
+
+class ViewerTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="viewer", email="v@i.ew", password="whatever")
+        self.followed = User.objects.create_user(username="followed", email="f@o.ll", password="whatever")
+        self.followed.followers.add(self.user)
+
+    def test_anonymous_viewer_does_no_query(self):
+        viewer = Viewer(AnonymousUser())
+        with self.assertNumQueries(0):
+            self.assertFalse(viewer.follows(self.followed.id))
+            self.assertFalse(viewer.favorited(1))
+
+    def test_viewer_loads_each_id_once(self):
+        viewer = Viewer(self.user)
+        with self.assertNumQueries(1):
+            viewer.load_page(author_ids=[self.user.id, self.followed.id])
+            self.assertTrue(viewer.follows(self.followed.id))
+            self.assertFalse(viewer.follows(self.user.id))
+        with self.assertNumQueries(1):
+            self.assertFalse(viewer.favorited(1))
+            self.assertFalse(viewer.favorited(1))
+
+
+class AuthCacheTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="cached", email="c@a.ch", password="whatever")
+        self.token = str(create_jwt_token(self.user))
+        self.session = Session.objects.get(user=self.user)
+        self.request = RequestFactory().get("/")
+
+    def authenticate(self) -> AuthDetails:
+        return TokenAuth().authenticate(self.request, self.token)
+
+    def test_session_and_user_are_cached(self):
+        with self.assertNumQueries(2):
+            self.authenticate()
+        with self.assertNumQueries(0):
+            details = self.authenticate()
+            self.assertEqual((details.user, details.session), (self.user, self.session))
+        with self.assertNumQueries(0):
+            details = async_to_sync(AsyncTokenAuth().authenticate)(self.request, self.token)
+            self.assertEqual((details.user, details.session), (self.user, self.session))
+
+    @override_settings(AUTH_CACHE_TIMEOUT=0)
+    def test_cache_disabled(self):
+        self.authenticate()
+        with self.assertNumQueries(2):
+            self.authenticate()
+
+    def test_put_user_forgets_cached_user(self):
+        self.authenticate()
+        client = TestClient(router, headers={"Authorization": f"Token {self.token}"})
+        client.put("user", json={"user": {"bio": "Updated"}})
+        with self.assertNumQueries(2):
+            self.assertEqual(self.authenticate().user.bio, "Updated")
+
+    def test_deactivation_forgets_cached_user(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaisesMessage(APIError, "invalid_user"):
+            self.authenticate()
+
+    def test_revocation_forgets_cached_session(self):
+        self.authenticate()
+        self.session.invalidate_session()
+        with self.assertRaisesMessage(APIError, "session_expired"):
+            self.authenticate()
+        self.session.delete()
+        with self.assertRaisesMessage(APIError, "session_not_found"):
+            self.authenticate()
+
+    def test_logout_all_forgets_cached_sessions(self):
+        other_token = str(create_jwt_token(self.user))
+        client = Client()
+        self.assertEqual(client.get("/api/user", HTTP_AUTHORIZATION=f"Token {other_token}").status_code, 200)
+        self.assertEqual(client.post("/auth/logout/all/", HTTP_AUTHORIZATION=f"Bearer {self.token}").status_code, 200)
+        with self.assertRaisesMessage(APIError, "session_expired"):
+            client.get("/api/user", HTTP_AUTHORIZATION=f"Token {other_token}")
+
+    def test_cached_session_still_expires(self):
+        self.session.expired_at = timezone.now() + timedelta(seconds=1)
+        self.session.save()
+        self.authenticate()
+        with mock.patch("helpers.jwt_utils.timezone.now", return_value=timezone.now() + timedelta(seconds=2)):
+            with self.assertNumQueries(0), self.assertRaisesMessage(APIError, "session_expired"):
+                self.authenticate()
+
+
+class DecodedTokensTestCase(TestCase):
+    def setUp(self):
+        decoded_tokens.clear()
+
+    def token(self, session_id: str = "session", exp: int | None = None) -> str:
+        exp = exp if exp is not None else int(time.time()) + 60
+        return generate_jwt(JWTPayload(user_id=1, type="access", exp=exp, session_id=session_id))
+
+    def test_tokens_are_verified_once(self):
+        token = self.token()
+        with mock.patch("helpers.jwt_utils.decode_jwt", wraps=decode_jwt) as decode:
+            payloads = [decoded_tokens.decode(token) for _ in range(3)]
+        self.assertEqual(decode.call_count, 1)
+        self.assertEqual({payload.session_id for payload in payloads}, {"session"})
+        self.assertEqual((decoded_tokens.hits, decoded_tokens.misses, decoded_tokens.hit_rate), (2, 1, 2 / 3))
+
+    def test_expired_payloads_are_not_returned(self):
+        token = self.token(exp=int(time.time()) + 1)
+        decoded_tokens.decode(token)
+        with (
+            mock.patch("helpers.jwt_utils.time.time", return_value=time.time() + 2),
+            mock.patch("helpers.jwt_utils.decode_jwt", side_effect=JWTExpiredError),
+            self.assertRaisesMessage(APIError, "expired_token"),
+        ):
+            decoded_tokens.decode(token)
+        self.assertEqual((decoded_tokens.hits, decoded_tokens.misses), (0, 2))
+
+    def test_invalid_tokens_are_not_cached(self):
+        for _ in range(2):
+            with self.assertRaisesMessage(APIError, "invalid_token"):
+                decoded_tokens.decode(self.token()[:-2])
+        self.assertEqual((decoded_tokens.hits, decoded_tokens.misses), (0, 2))
+
+    @override_settings(JWT_DECODE_CACHE_SIZE=2)
+    def test_least_recently_used_tokens_are_evicted(self):
+        first, second, third = (self.token(session_id) for session_id in ("first", "second", "third"))
+        for token in (first, second, first, third, first, second):
+            decoded_tokens.decode(token)
+        self.assertEqual((decoded_tokens.hits, decoded_tokens.misses), (2, 4))  # Only the second was evicted
+
+
+@override_settings(JWT_STATELESS=True)
+class StatelessAuthTestCase(TestCase):
+    def setUp(self):
+        revoked_sessions.clear()
+        self.user = User.objects.create_user(username="stateless", email="s@ta.te", password="whatever")
+        self.token = str(create_jwt_token(self.user))
+        self.session = Session.objects.get(user=self.user)
+        self.request = RequestFactory().get("/")
+
+    def authenticate(self) -> AuthDetails:
+        return TokenAuth().authenticate(self.request, self.token)
+
+    def test_sessions_are_not_read(self):
+        with self.assertNumQueries(2):  # The revoked sessions, then the user
+            details = self.authenticate()
+        self.assertEqual((details.user, details.session.id), (self.user, self.session.id))
+        with self.assertNumQueries(0):
+            self.authenticate()
+            async_to_sync(AsyncTokenAuth().authenticate)(self.request, self.token)
+
+    @override_settings(JWT_REVOCATION_REFRESH_SECONDS=0)
+    def test_revoked_sessions_are_rejected(self):
+        self.authenticate()
+        Session.invalidate_all_user_sessions(self.user)  # An update, that doesn't forget the cached auth
+        with self.assertRaisesMessage(APIError, "session_expired"):
+            self.authenticate()
+        with self.assertRaisesMessage(APIError, "session_expired"):
+            async_to_sync(AsyncTokenAuth().authenticate)(self.request, self.token)
+
+    @override_settings(JWT_REVOCATION_REFRESH_SECONDS=0)
+    def test_sessions_of_deactivated_users_are_rejected(self):
+        self.authenticate()
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        with self.assertRaisesMessage(APIError, "session_expired"):
+            self.authenticate()
+        User.objects.filter(pk=self.user.pk).update(is_active=True)
+        self.authenticate()
+
+    def test_revocations_are_seen_on_refresh(self):
+        self.authenticate()
+        self.session.invalidate_session()
+        caches["auth"].clear()  # As if cached by another process
+        self.authenticate()
+        revoked_sessions.refresh()
+        with self.assertRaisesMessage(APIError, "session_expired"):
+            self.authenticate()
+
+    def test_purged_sessions_stay_revoked(self):
+        self.session.invalidate_session()
+        revoked_sessions.refresh()
+        Session.purge_expired_sessions()
+        revoked_sessions.refresh()
+        self.assertIn(self.session.id, revoked_sessions)
+
+    def test_only_sessions_whose_tokens_may_be_valid_are_kept(self):
+        Session.objects.filter(pk=self.session.pk).update(expired_at=timezone.now() - timedelta(days=1))
+        upcoming = Session.create_session(self.user, ip_address=None)
+        Session.objects.filter(pk=upcoming.pk).update(expired_at=timezone.now() + timedelta(seconds=5))
+        revoked_sessions.refresh()
+        self.assertEqual(len(revoked_sessions), 1)
+        self.assertNotIn(upcoming.id, revoked_sessions)
+        with mock.patch("helpers.revocations.time.time", return_value=time.time() + 6):
+            self.assertIn(upcoming.id, revoked_sessions)
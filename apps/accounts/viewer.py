@@ -0,0 +1,79 @@
+from collections.abc import Iterable
+
+from django.contrib.auth.models import AnonymousUser
+from django.db.models import QuerySet, Value
+from django.http import HttpRequest
+
+from accounts.models import User
+
+
+class Viewer:
+    """
+    What the user of a request relates to: followed authors and favorited articles.
+    Views `load_page` with the ids of everything they return, so that resolvers only do set lookups.
+    Anything that wasn't loaded is looked up on first use.
+    """
+
+    def __init__(self, user: User | AnonymousUser) -> None:
+        self.user = user
+        self.followed_ids: set[int] = set()
+        self.favorited_ids: set[int] = set()
+        self._known_author_ids: set[int] = set()
+        self._known_article_ids: set[int] = set()
+
+    def _unknown_rows(self, author_ids: Iterable[int], article_ids: Iterable[int]) -> QuerySet | None:
+        """The query for whichever of these authors are followed and articles favorited, if any still needs it"""
+        author_ids = set(author_ids) - self._known_author_ids
+        article_ids = set(article_ids) - self._known_article_ids
+        self._known_author_ids |= author_ids
+        self._known_article_ids |= article_ids
+        if not self.user.is_authenticated or not (author_ids or article_ids):
+            return None
+        follows = User.followers.through.objects.filter(to_user_id=self.user.id, from_user_id__in=author_ids)
+        favorites = User.favorites.through.objects.filter(user_id=self.user.id, article_id__in=article_ids)
+        return follows.values_list(Value("author"), "from_user_id").union(
+            favorites.values_list(Value("article"), "article_id"), all=True
+        )
+
+    def _add(self, kind: str, pk: int) -> None:
+        (self.followed_ids if kind == "author" else self.favorited_ids).add(pk)
+
+    def load_page(self, author_ids: Iterable[int] = (), article_ids: Iterable[int] = ()) -> None:
+        """Look up which of these authors are followed and which of these articles are favorited, in one query"""
+        for kind, pk in self._unknown_rows(author_ids, article_ids) or ():
+            self._add(kind, pk)
+
+    async def aload_page(self, author_ids: Iterable[int] = (), article_ids: Iterable[int] = ()) -> None:
+        if (rows := self._unknown_rows(author_ids, article_ids)) is not None:
+            async for kind, pk in rows:
+                self._add(kind, pk)
+
+    def follows(self, author_id: int) -> bool:
+        if author_id not in self._known_author_ids:
+            self.load_page(author_ids=[author_id])
+        return author_id in self.followed_ids
+
+    def set_favorited(self, article_id: int, favorited: bool) -> None:
+        """Record a favorite change made by this request, so that it isn't looked up"""
+        self._known_article_ids.add(article_id)
+        (self.favorited_ids.add if favorited else self.favorited_ids.discard)(article_id)
+
+    def favorited(self, article_id: int) -> bool:
+        if article_id not in self._known_article_ids:
+            self.load_page(article_ids=[article_id])
+        return article_id in self.favorited_ids
+
+
+def get_viewer(request: HttpRequest) -> Viewer:
+    """The `Viewer` set by `TokenAuth`, or one for `request.user` on routes without it"""
+    if "viewer" not in request.__dict__:
+        request.viewer = Viewer(request.user)
+    return request.viewer
+
+
+async def aget_viewer(request: HttpRequest) -> Viewer:
+    """`get_viewer` for async views, where the lazy `request.user` of routes without `TokenAuth` can't be evaluated"""
+    if "viewer" not in request.__dict__:
+        user = await request.auser() if "auser" in request.__dict__ else request.user  # Set by the auth middleware
+        request.viewer = Viewer(user)
+    return request.viewer
@@ -1,78 +1,157 @@
+import json
 from typing import Any
 
 from accounts.models import User
+from accounts.viewer import aget_viewer, get_viewer
 from django.db import IntegrityError, transaction
-from django.http import HttpResponse
-from ninja import Router
-from ninja.errors import AuthorizationError
+from django.db.models import Prefetch, QuerySet
+from django.http import HttpResponse, StreamingHttpResponse
+from ninja import Router, Schema
+from ninja.decorators import decorate_view
+from ninja.errors import AuthorizationError, ValidationError
 
-from articles.models import Article, Tag
-from articles.schemas import ArticleCreateSchema, ArticleListOutSchema, ArticleOutSchema, ArticlePartialUpdateSchema
+from articles import cache_scopes, counters, favorites, imports, loaders, rendering, search, timeline
+from articles.models import Article, ArticleCount, Tag
+from articles.schemas import (
+    ArticleCreateSchema,
+    ArticleExportSchema,
+    ArticleHtmlOutSchema,
+    ArticleListCountsOutSchema,
+    ArticleListOutSchema,
+    ArticleOutSchema,
+    ArticlePartialUpdateSchema,
+)
+from helpers.cache import cache_anonymous
+from helpers.conditional import make_etag, not_modified
 from helpers.empty import EMPTY
-from helpers.exceptions import clean_integrity_error, get_or_404
-from helpers.jwt_utils import AuthedRequest, TokenAuth
+from helpers.exceptions import ResourceNotFound, aget_or_404, clean_integrity_error, get_or_404
+from helpers.export import ndjson_response
+from helpers.jwt_utils import AsyncTokenAuth, AuthedRequest, TokenAuth
+from helpers.pagination import akeyset_page
+from helpers.projection import project
 
 router = Router()
+Scope = ArticleCount.Scope
 
 
-@router.post("/articles/{slug}/favorite", auth=TokenAuth(), response={200: Any, 404: Any})
+def _articles(schema: type[Schema]) -> QuerySet:
+    """Articles only loading what `schema` outputs, plus what its resolvers read"""
+    return project(Article.objects.all(), schema, extra=["favorites_count"])
+
+
+async def _paginate(
+    queryset: QuerySet, limit: int, offset: int, cursor: str | None, ordering: tuple[str, ...] = ("-created", "-id")
+) -> tuple[list[Article], str | None]:
+    """
+    Offset pagination as required by the RealWorld API spec, or keyset pagination when a `cursor` is given.
+    An empty `cursor` requests the first page in cursor mode, the returned `nextCursor` is then passed to get the next.
+    """
+    if cursor is not None:
+        return await akeyset_page(queryset, cursor, limit)
+    return [article async for article in queryset.order_by(*ordering)[offset : offset + limit]], None
+
+
+async def _articles_count(
+    queryset: QuerySet, tag: str | None, author: str | None, favorited: str | None, q: str | None = None
+) -> int:
+    """Read from the maintained counters, only falling back to a `COUNT(*)` when filters are combined or searching"""
+    if q:
+        return await queryset.acount()
+    filters = []
+    if tag:
+        filters.append((Scope.TAG, Tag.objects.filter(name=tag).values("id")))
+    if author:
+        filters.append((Scope.AUTHOR, User.objects.filter(username=author).values("id")))
+    if favorited:
+        filters.append((Scope.FAVORITED, User.objects.filter(username=favorited).values("id")))
+    if not filters:
+        return await counters.aread(Scope.ALL)
+    if len(filters) == 1:
+        return await counters.aread(*filters[0])
+    return await queryset.acount()
+
+
+def _favorite_response(
+    request: AuthedRequest, article: Article, favorited: bool, favorites_count: int
+) -> dict[str, Any]:
+    """Built from what the favorite change returned, without reading the article again"""
+    article.favorites_count = favorites_count
+    get_viewer(request).set_favorited(article.id, favorited)
+    loaders.prime(request, [article])
+    return {"article": ArticleOutSchema.from_orm(article, context={"request": request})}
+
+
+@router.post("/articles/{slug}/favorite", auth=TokenAuth(), response={200: Any, 404: Any, 409: Any})
 def favorite(request: AuthedRequest, slug: str) -> dict[str, Any] | tuple[int, dict[str, Any]]:
-    article = get_or_404(Article.objects.with_favorites(request.user), "article", slug=slug)
-    if article.favorites.filter(id=request.user.id).exists():
+    article = get_or_404(_articles(ArticleOutSchema), "article", slug=slug)
+    if (favorites_count := favorites.add(article.id, request.user)) is None:
         return 409, {"errors": {"body": ["Already Favourited Article"]}}
-    article.favorites.add(request.user)
-    qs = Article.objects.with_favorites(request.user)
-    article = get_or_404(qs, "article", id=article.id)  # Now with updated values
-    return {"article": ArticleOutSchema.from_orm(article, context={"request": request})}
+    return _favorite_response(request, article, True, favorites_count)
 
 
 @router.delete("/articles/{slug}/favorite", auth=TokenAuth(), response={200: Any, 404: Any})
 def unfavorite(request: AuthedRequest, slug: str) -> dict[str, Any]:
-    article = get_or_404(Article.objects.with_favorites(request.user), "article", slug=slug)
-    get_or_404(article.favorites, "article", id=request.user.id)
-    article.favorites.remove(request.user.id)
-    qs = Article.objects.with_favorites(request.user)
-    article = get_or_404(qs, "article", id=article.id)  # Now with updated values
-    return {"article": ArticleOutSchema.from_orm(article, context={"request": request})}
+    article = get_or_404(_articles(ArticleOutSchema), "article", slug=slug)
+    if (favorites_count := favorites.remove(article.id, request.user)) is None:
+        raise ResourceNotFound("article")
+    return _favorite_response(request, article, False, favorites_count)
 
 
-@router.get("/articles/feed", auth=TokenAuth(), response={200: Any, 404: Any})
-def feed(request: AuthedRequest, limit: int = 20, offset: int = 0) -> dict[str, Any]:
+@router.get("/articles/feed", auth=AsyncTokenAuth(), response={200: Any, 404: Any})
+async def feed(
+    request: AuthedRequest, limit: int = 20, offset: int = 0, cursor: str | None = None, counts: bool = False
+) -> dict[str, Any]:
+    """`counts` adds the `commentsCount` of each article"""
+    schema = ArticleListCountsOutSchema if counts else ArticleListOutSchema
     followed_authors = User.objects.filter(followers=request.user)
-    queryset = Article.objects.with_favorites(request.user).filter(author__in=followed_authors).order_by("-created")
-    articles = list(queryset[offset : offset + limit])
+    article_ids, next_cursor = await timeline.afeed_page(request.user, limit, offset, cursor)
+    articles_by_id = {a.id: a async for a in _articles(schema).filter(id__in=article_ids)}
+    articles = [articles_by_id[article_id] for article_id in article_ids if article_id in articles_by_id]
+    await loaders.aprime(request, articles)
     return {
-        "articlesCount": queryset.count(),
-        "articles": [ArticleListOutSchema.from_orm(a, context={"request": request}) for a in articles],
+        "articlesCount": await counters.aread(Scope.AUTHOR, followed_authors.values("id")),
+        "articles": [schema.from_trusted(a, request) for a in articles],
+        **({"nextCursor": next_cursor} if cursor is not None else {}),
     }
 
 
 @router.get("/articles", response={200: Any})
-def list_articles(
+@decorate_view(cache_anonymous(cache_scopes.list_scopes))
+async def list_articles(
     request,
     tag: str | None = None,
     author: str | None = None,
     favorited: str | None = None,
     limit: int = 20,
     offset: int = 0,
+    cursor: str | None = None,
+    q: str | None = None,
+    counts: bool = False,
 ) -> dict[str, Any]:
-    queryset = Article.objects.with_favorites(request.user)
+    """
+    `q` searches the title, summary and content, most relevant first, which can't be paginated with a `cursor`.
+    `counts` adds the `commentsCount` of each article.
+    """
+    if q and cursor is not None:
+        raise ValidationError([{"loc": ("query", "cursor"), "msg": "can't be used with q"}])
+    schema = ArticleListCountsOutSchema if counts else ArticleListOutSchema
+    queryset = _articles(schema)
     queryset = queryset.filter(tags__name=tag) if tag else queryset
     queryset = queryset.filter(author__username=author) if author else queryset
     queryset = queryset.filter(favorites__username=favorited) if favorited else queryset
-    queryset = queryset.order_by("-created")
-    articles = list(queryset[offset : offset + limit])
+    queryset = search.search(queryset, q) if q else queryset
+    ordering = ("-rank", "-created", "-id") if q else ("-created", "-id")
+    articles, next_cursor = await _paginate(queryset, limit, offset, cursor, ordering)
+    await loaders.aprime(request, articles)
     return {
-        "articles": [ArticleListOutSchema.from_orm(a, context={"request": request}) for a in articles],
-        "articlesCount": queryset.count(),
+        "articles": [schema.from_trusted(a, request) for a in articles],
+        "articlesCount": await _articles_count(queryset, tag, author, favorited, q),
+        **({"nextCursor": next_cursor} if cursor is not None else {}),
     }
 
 
 @router.post("/articles", auth=TokenAuth(), response={201: Any, 409: Any, 422: Any})
 def create_article(request: AuthedRequest, data: ArticleCreateSchema) -> tuple[int, dict[str, Any]]:
-    tag_objs = (
-        [Tag.objects.get_or_create(name=name)[0] for name in data.article.tags] if data.article.tags != EMPTY else []
-    )
     with transaction.atomic():
         try:
             article = Article.objects.create(
@@ -84,16 +163,68 @@ def create_article(request: AuthedRequest, data: ArticleCreateSchema) -> tuple[i
             if field == "slug":
                 field = "title"
             return 409, {"errors": {field: ["has already been taken"]}}
-        if tag_objs:
-            article.tags.set(tag_objs)
-    article = get_or_404(Article.objects.with_favorites(request.user), "article", id=article.id)
+        if data.article.tags != EMPTY and data.article.tags:
+            article.tags.add(*Tag.objects.upsert(data.article.tags).values())
+    article = get_or_404(_articles(ArticleOutSchema), "article", id=article.id)
     return 201, {"article": ArticleOutSchema.from_orm(article, context={"request": request})}
 
 
-@router.get("/articles/{slug}", auth=TokenAuth(pass_even=True), response={200: Any, 404: Any})
-def retrieve(request, slug: str) -> dict[str, Any]:
-    article = get_or_404(Article.objects.with_favorites(request.user), "article", slug=slug)
-    return {"article": ArticleOutSchema.from_orm(article, context={"request": request})}
+@router.post("/import/articles", auth=TokenAuth(), response={201: Any, 422: Any})
+def import_articles(request: AuthedRequest) -> tuple[int, dict[str, Any]]:
+    """
+    Bulk import articles authored by the user, from a body holding a JSON array of what `create_article` takes as
+    `article`, or the same as NDJSON, which is read as it arrives. Invalid records are skipped and reported.
+    """
+    try:
+        report = imports.import_articles(imports.read_records(request), author=request.user)
+    except json.JSONDecodeError as err:
+        return 422, {"errors": {"body": [f"invalid JSON: {err}"]}}
+    return 201, {
+        "imported": report.imported,
+        "errors": report.errors,
+        "seconds": report.seconds,
+        "articlesPerSecond": report.per_second,
+    }
+
+
+@router.get("/export/articles", auth=TokenAuth(), response={200: Any})
+def export_articles(request: AuthedRequest, after: int | None = None) -> StreamingHttpResponse:
+    """
+    All the articles, with their author and tags, as NDJSON streamed by ascending id, for mirroring them in bulk.
+    An interrupted export resumes from the last id received, passed as `after`.
+    """
+    tags = Prefetch("tags", queryset=Tag.objects.only("name"))
+    return ndjson_response(
+        request, project(Article.objects.all(), ArticleExportSchema).prefetch_related(tags), ArticleExportSchema, after
+    )
+
+
+@router.get("/articles/{slug}", auth=AsyncTokenAuth(pass_even=True), response={200: Any, 404: Any})
+async def retrieve(request, slug: str, response: HttpResponse, html: bool = False) -> dict[str, Any] | HttpResponse:
+    """
+    Conditional GET: the body is only loaded and serialized when the client doesn't have the current version.
+    There is no `Last-Modified`, as favorites and follows change the body without moving any timestamp.
+    `html` adds the body rendered as HTML.
+    """
+    schema = ArticleHtmlOutSchema if html else ArticleOutSchema
+    body_fields = ["content", "body_html"] if html else ["content"]
+    article = await aget_or_404(_articles(schema).defer(*body_fields), "article", slug=slug)
+    viewer, author = await aget_viewer(request), article.author
+    await viewer.aload_page(author_ids=[author.id], article_ids=[article.id])
+    etag = make_etag(
+        article.id,
+        article.updated,
+        article.favorites_count,
+        (author.username, author.bio, author.image),
+        viewer.favorited(article.id),
+        viewer.follows(author.id),
+        html and rendering.VERSION,
+    )
+    if unchanged := not_modified(request, response, etag):
+        return unchanged
+    await article.arefresh_from_db(fields=body_fields)
+    await loaders.aprime(request, [article])
+    return {"article": schema.from_orm(article, context={"request": request})}
 
 
 @router.delete("/articles/{slug}", auth=TokenAuth(), response={200: Any, 204: Any, 404: Any, 403: Any, 401: Any})
@@ -109,12 +240,11 @@ def destroy(request: AuthedRequest, slug: str) -> HttpResponse:
 @router.put("/articles/{slug}", auth=TokenAuth(), response={200: Any, 404: Any, 403: Any, 401: Any})
 def update(request: AuthedRequest, slug: str, data: ArticlePartialUpdateSchema) -> dict[str, Any]:
     """This is wrong, but this method behaves like a PATCH, as required by the RealWorld API spec"""
-    article = get_or_404(Article.objects.with_favorites(request.user), "article", slug=slug)
+    article = get_or_404(_articles(ArticleOutSchema), "article", slug=slug)
     if request.user != article.author:
         raise AuthorizationError
     update_data = data.article.dict(exclude_unset=True)
     new_tags = update_data.pop("tags", EMPTY)
-    tag_objs = [Tag.objects.get_or_create(name=name)[0] for name in new_tags] if new_tags is not EMPTY else EMPTY
     with transaction.atomic():
         updated_fields = []
         for attr, value in update_data.items():
@@ -122,11 +252,22 @@ def update(request: AuthedRequest, slug: str, data: ArticlePartialUpdateSchema)
             updated_fields.extend(["title", "slug"] if attr == "title" else [attr])
         updated_fields.append("updated")
         article.save(update_fields=updated_fields)
-        if tag_objs is not EMPTY:
-            article.tags.set(tag_objs)
+        if new_tags is not EMPTY:
+            article.tags.set(Tag.objects.upsert(new_tags).values())  # Only writes the difference
     return {"article": ArticleOutSchema.from_orm(article, context={"request": request})}
 
 
 @router.get("/tags", response={200: Any})
-def list_tags(request) -> dict[str, Any]:
-    return {"tags": [t.name for t in Tag.objects.all()]}
+@decorate_view(cache_anonymous("tags"))
+async def list_tags(request, top: int | None = None, counts: bool = False) -> dict[str, Any]:
+    """
+    All the tags as required by the RealWorld API spec, or only the `top` ones by number of articles, read from
+    their counters. With `top`, `counts` adds the number of articles of each of these tags.
+    """
+    if top is None:
+        return {"tags": [t.name async for t in Tag.objects.all()]}
+    popular = await counters.atop(Scope.TAG, top)
+    tag_rows = Tag.objects.filter(id__in=[tag_id for tag_id, _ in popular]).values_list("id", "name")
+    names = {tag_id: name async for tag_id, name in tag_rows}
+    tags = [(names[tag_id], count) for tag_id, count in popular if tag_id in names]
+    return {"tags": [name for name, _ in tags], **({"articlesCounts": dict(tags)} if counts else {})}
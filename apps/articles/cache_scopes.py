@@ -0,0 +1,62 @@
+"""
+Scopes of the cached responses of `list_articles` to anonymous users (see `helpers.cache`), so that each write only
+invalidates the pages it can change. Every page depends on `ARTICLES`, moved by what changes them all, like the profile
+of an author or a renamed tag. Pages filtered by author, tag or favoriting user depend on the scope of each of their
+filters, the others on `ALL`, and those with `counts` on `COUNTS` too. Changing an article, its tags or its favorites
+moves the scopes of all the pages that can hold it, from `article_scopes`.
+"""
+
+from collections.abc import Iterable
+
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
+from django.http import HttpRequest
+
+from articles.models import Tag
+
+User = get_user_model()
+
+ARTICLES = "articles"
+ALL = "articles:all"
+COUNTS = "articles:counts"
+
+
+def author(username: str) -> str:
+    return f"articles:author:{username}"
+
+
+def tag(name: str) -> str:
+    return f"articles:tag:{name}"
+
+
+def favorited(username: str) -> str:
+    return f"articles:favorited:{username}"
+
+
+def list_scopes(request: HttpRequest) -> tuple[str, ...]:
+    """Those of a `list_articles` request, a search only filtered by `q` depending on `ALL`"""
+    filters = [(author, "author"), (tag, "tag"), (favorited, "favorited")]
+    scopes = [scope(request.GET[param]) for scope, param in filters if request.GET.get(param)]
+    return (ARTICLES, *(scopes or [ALL]), *([COUNTS] if "counts" in request.GET else []))
+
+
+def favorited_scopes(usernames: Iterable[str]) -> list[str]:
+    return [favorited(username) for username in usernames]
+
+
+def tag_scopes(names: Iterable[str]) -> list[str]:
+    return [tag(name) for name in names]
+
+
+def _names(queryset: QuerySet, field: str) -> QuerySet:
+    return queryset.values_list(field, flat=True).distinct()
+
+
+def article_scopes(article_ids: Iterable[int]) -> list[str]:
+    """Those of the pages that can hold these articles, reading their authors, tags and favoriting users"""
+    return [
+        ALL,
+        *(author(username) for username in _names(User.objects.filter(article__in=article_ids), "username")),
+        *tag_scopes(_names(Tag.objects.filter(article__in=article_ids), "name")),
+        *favorited_scopes(_names(User.objects.filter(favorites__in=article_ids), "username")),
+    ]
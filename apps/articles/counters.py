@@ -0,0 +1,94 @@
+"""
+Incrementally maintained `articlesCount` values, so that listing articles doesn't need a `COUNT(*)` over the filtered
+queryset. Counters are adjusted by the signal handlers in `articles.signals`, inside the transaction of the write.
+`rebuild` recomputes everything from scratch, if drift is ever suspected.
+`Article.favorites_count` is maintained the same way, and fixed by `repair_favorites_counts`.
+"""
+
+from collections import defaultdict
+from collections.abc import Iterable, Mapping
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, QuerySet, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from articles.models import Article, ArticleCount
+
+Scope = ArticleCount.Scope
+
+
+def adjust(scope: Scope, deltas: Mapping[int, int]) -> None:
+    """Add each delta to the counter of its `ref_id`, creating missing counters"""
+    deltas = {ref_id: delta for ref_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    ArticleCount.objects.bulk_create(
+        [ArticleCount(scope=scope, ref_id=ref_id) for ref_id in deltas], ignore_conflicts=True
+    )
+    ref_ids_by_delta: dict[int, list[int]] = defaultdict(list)
+    for ref_id, delta in deltas.items():
+        ref_ids_by_delta[delta].append(ref_id)
+    for delta, ref_ids in ref_ids_by_delta.items():
+        ArticleCount.objects.filter(scope=scope, ref_id__in=ref_ids).update(value=F("value") + delta)
+
+
+def read(scope: Scope, ref_ids: QuerySet | Iterable[int] = (0,)) -> int:
+    """Sum of the counters of `ref_ids`, which may be a subquery, like the followed authors for a feed"""
+    queryset = ArticleCount.objects.filter(scope=scope, ref_id__in=ref_ids)
+    return queryset.aggregate(total=Sum("value"))["total"] or 0
+
+
+async def aread(scope: Scope, ref_ids: QuerySet | Iterable[int] = (0,)) -> int:
+    queryset = ArticleCount.objects.filter(scope=scope, ref_id__in=ref_ids)
+    return (await queryset.aaggregate(total=Sum("value")))["total"] or 0
+
+
+def _top(scope: Scope, limit: int) -> QuerySet:
+    queryset = ArticleCount.objects.filter(scope=scope, value__gt=0).order_by("-value", "ref_id")
+    return queryset.values_list("ref_id", "value")[: max(limit, 0)]
+
+
+def top(scope: Scope, limit: int) -> list[tuple[int, int]]:
+    """The `(ref_id, value)` of the `limit` highest non-zero counters, highest first"""
+    return list(_top(scope, limit)) if limit > 0 else []
+
+
+async def atop(scope: Scope, limit: int) -> list[tuple[int, int]]:
+    return [row async for row in _top(scope, limit)] if limit > 0 else []
+
+
+def forget(scope: Scope, ref_id: int) -> None:
+    ArticleCount.objects.filter(scope=scope, ref_id=ref_id).delete()
+
+
+@transaction.atomic
+def rebuild() -> int:
+    """Recompute every counter from the articles tables, returns the number of counters written"""
+    tags_through, favorites_through = Article.tags.through, Article.favorites.through
+    counts = [
+        ArticleCount(scope=Scope.ALL, ref_id=0, value=Article.objects.count()),
+        *(
+            ArticleCount(scope=Scope.AUTHOR, ref_id=row["author_id"], value=row["n"])
+            for row in Article.objects.values("author_id").annotate(n=Count("id")).order_by()
+        ),
+        *(
+            ArticleCount(scope=Scope.TAG, ref_id=row["tag_id"], value=row["n"])
+            for row in tags_through.objects.values("tag_id").annotate(n=Count("id")).order_by()
+        ),
+        *(
+            ArticleCount(scope=Scope.FAVORITED, ref_id=row["user_id"], value=row["n"])
+            for row in favorites_through.objects.values("user_id").annotate(n=Count("id")).order_by()
+        ),
+    ]
+    ArticleCount.objects.all().delete()
+    ArticleCount.objects.bulk_create(counts)
+    return len(counts)
+
+
+@transaction.atomic
+def repair_favorites_counts() -> int:
+    """Fix `Article.favorites_count` where it drifted from the favorites table, returns the number of fixed articles"""
+    favorites = Article.favorites.through.objects.filter(article_id=OuterRef("pk")).values("article_id")
+    actual = Coalesce(Subquery(favorites.annotate(n=Count("id")).values("n")), 0)
+    drifted = Article.objects.annotate(actual=actual).exclude(favorites_count=F("actual"))
+    return Article.objects.filter(pk__in=drifted.values("pk")).update(favorites_count=actual)
@@ -0,0 +1,172 @@
+"""
+Bulk article import, to load a whole corpus instead of one `POST /articles` at a time.
+Records are validated like the body of `create_article`, then written by chunks, each in one transaction: slugs are
+made unique for the whole chunk at once, tags are upserted in one statement, articles and their tag rows are inserted
+with `bulk_create`, again with fresh slugs if a concurrent write took one in the meantime, as `Article.save` does.
+As this bypasses `Article.save` and the signals, everything their handlers maintain is updated here for the whole chunk.
+"""
+
+import dataclasses
+import json
+import time
+import uuid
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from itertools import chain, islice
+from typing import IO, Any
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.utils.text import slugify
+
+from articles import cache_scopes, counters, rendering, search, timeline
+from articles.models import SLUG_ATTEMPTS, Article, ArticleCount, Tag
+from articles.schemas import ArticleInCreateSchema
+from helpers.cache import invalidate
+from helpers.empty import EMPTY
+from helpers.exceptions import clean_integrity_error
+
+User = get_user_model()
+Scope = ArticleCount.Scope
+
+
+@dataclasses.dataclass
+class InvalidRecord:
+    error: str
+
+
+@dataclasses.dataclass
+class ImportReport:
+    imported: int = 0
+    errors: list[dict[str, Any]] = dataclasses.field(default_factory=list)  # The number of each skipped record
+    seconds: float = 0.0
+
+    @property
+    def per_second(self) -> float:
+        return self.imported / self.seconds if self.seconds else 0.0
+
+
+def read_records(stream: IO[bytes]) -> Iterator[Any]:
+    """
+    Decode a JSON array of records, or NDJSON with one record per line, which is read lazily.
+    Raises `json.JSONDecodeError` if a JSON array is invalid, an invalid NDJSON line only yields an `InvalidRecord`.
+    """
+    while (first := stream.read(1)) and first.isspace():
+        pass
+    if first == b"[":
+        yield from json.loads(first + stream.read())
+        return
+    for line in chain([first + stream.readline()], stream) if first else ():
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as err:
+                yield InvalidRecord(str(err))
+
+
+def _unique_slugs(titles: list[str]) -> list[str]:
+    """Slugs like those of `Article.save`, checked against the database and each other in one query"""
+    bases = [slugify(title) for title in titles]
+    taken = set(Article.objects.filter(slug__in=bases).values_list("slug", flat=True))
+    slugs = []
+    for base in bases:
+        slug = f"{base}-{uuid.uuid4().hex[:8]}" if base in taken else base
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def _username(record: Any) -> str | None:
+    username = record.get("author") if isinstance(record, dict) else None
+    return username if isinstance(username, str) else None
+
+
+def _validate(
+    chunk: list[tuple[int, Any]], author: User | None, report: ImportReport
+) -> list[tuple[int, ArticleInCreateSchema, int]]:
+    """Numbers of the valid records, with the id of their author, the others being reported"""
+    authors = {}
+    if author is None:
+        usernames = {_username(record) for _, record in chunk}
+        authors = dict(User.objects.filter(username__in=usernames - {None}).values_list("username", "id"))
+    valid = []
+    for number, record in chunk:
+        try:
+            if isinstance(record, InvalidRecord):
+                raise ValueError(record.error)
+            data = ArticleInCreateSchema.model_validate(record)
+            author_id = author.id if author is not None else authors.get(_username(record))
+            if author_id is None:
+                raise ValueError(f"unknown author: {record.get('author')}")
+        except ValueError as err:
+            report.errors.append({"record": number, "error": str(err)})
+            continue
+        valid.append((number, data, author_id))
+    return valid
+
+
+def _insert(articles: list[Article]) -> list[Article]:
+    """`bulk_create` in a savepoint, retried with the slugs made unique again if one was taken in the meantime"""
+    for attempt in range(SLUG_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                return Article.objects.bulk_create(articles)
+        except IntegrityError as err:
+            if attempt == SLUG_ATTEMPTS - 1 or clean_integrity_error(err) != "slug":
+                raise
+            for article, slug in zip(articles, _unique_slugs([a.title for a in articles]), strict=True):
+                article.slug = slug
+
+
+@transaction.atomic
+def _import_chunk(records: list[tuple[ArticleInCreateSchema, int]]) -> None:
+    tag_names = [list(dict.fromkeys(data.tags)) if data.tags != EMPTY else [] for data, _ in records]
+    tag_ids = Tag.objects.upsert(chain.from_iterable(tag_names))
+    slugs = _unique_slugs([data.title for data, _ in records])
+    articles = _insert(
+        [
+            Article(
+                author_id=author_id,
+                title=data.title,
+                summary=data.summary,
+                content=data.content,
+                body_html=rendering.render(data.content),
+                slug=slug,
+            )
+            for (data, author_id), slug in zip(records, slugs, strict=True)
+        ]
+    )
+    Article.tags.through.objects.bulk_create(
+        Article.tags.through(article_id=article.id, tag_id=tag_ids[name])
+        for article, names in zip(articles, tag_names, strict=True)
+        for name in names
+    )
+    counters.adjust(Scope.ALL, {0: len(articles)})
+    counters.adjust(Scope.AUTHOR, Counter(article.author_id for article in articles))
+    counters.adjust(Scope.TAG, Counter(tag_ids[name] for names in tag_names for name in names))
+    timeline.fan_out(articles)
+    search.index(article.id for article in articles)
+    invalidate(cache_scopes.ARTICLES, "tags")
+
+
+def import_articles(records: Iterable[Any], author: User | None = None, chunk_size: int = 500) -> ImportReport:
+    """
+    Import decoded records, shaped like the `article` of a `create_article` body. All are authored by `author`,
+    or if it isn't given, by the user whose username is the `author` of each record. Invalid records are skipped, as
+    are the chunks whose slugs kept being taken by concurrent writes.
+    """
+    report = ImportReport()
+    start = time.perf_counter()
+    numbered = enumerate(records, start=1)
+    while chunk := list(islice(numbered, chunk_size)):
+        if valid := _validate(chunk, author, report):
+            try:
+                _import_chunk([(data, author_id) for _, data, author_id in valid])
+            except IntegrityError as err:
+                if clean_integrity_error(err) != "slug":
+                    raise
+                report.errors.extend({"record": number, "error": "slug conflict"} for number, _, _ in valid)
+                continue
+            report.imported += len(valid)
+    report.seconds = time.perf_counter() - start
+    return report
@@ -0,0 +1,49 @@
+from collections.abc import Iterable
+
+from accounts.viewer import aget_viewer, get_viewer
+from django.db.models import QuerySet
+from django.http import HttpRequest
+
+from articles.models import Article
+from helpers.loaders import BatchLoader, get_loader
+
+
+def _tag_rows(article_ids: set[int]) -> QuerySet:
+    through = Article.tags.through.objects.filter(article_id__in=article_ids)
+    return through.values_list("article_id", "tag__name").order_by("tag__name")
+
+
+def _group_names(rows: Iterable[tuple[int, str]]) -> dict[int, list[str]]:
+    names: dict[int, list[str]] = {}
+    for article_id, name in rows:
+        names.setdefault(article_id, []).append(name)
+    return names
+
+
+def tag_names(request: HttpRequest) -> BatchLoader[int, list[str]]:
+    """Sorted tag names of each of the given article ids"""
+
+    async def abatch_load(article_ids: set[int]) -> dict[int, list[str]]:
+        return _group_names([row async for row in _tag_rows(article_ids)])
+
+    return BatchLoader(lambda article_ids: _group_names(_tag_rows(article_ids)), default=[], abatch_load=abatch_load)
+
+
+def _page_ids(articles: list[Article]) -> dict[str, set[int]]:
+    return {"author_ids": {a.author_id for a in articles}, "article_ids": {a.id for a in articles}}
+
+
+def prime(request: HttpRequest, articles: Iterable[Article]) -> None:
+    """Prepare the tags loader and the viewer used by the article schemas to resolve a whole page at once"""
+    articles = list(articles)
+    get_loader(request, tag_names).prime(a.id for a in articles)
+    get_viewer(request).load_page(**_page_ids(articles))
+
+
+async def aprime(request: HttpRequest, articles: Iterable[Article]) -> None:
+    """`prime` for async views, also loading the tags, so that the schemas can then resolve without querying"""
+    articles = list(articles)
+    loader = get_loader(request, tag_names)
+    loader.prime(a.id for a in articles)
+    await loader.aload_pending()
+    await (await aget_viewer(request)).aload_page(**_page_ids(articles))
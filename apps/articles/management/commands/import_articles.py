@@ -0,0 +1,38 @@
+import json
+import sys
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from articles.imports import import_articles, read_records
+
+
+class Command(BaseCommand):
+    help = "Bulk import articles from a JSON array or NDJSON file, shaped like the `article` of a creation request"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("path", type=str, help="File to import, - for the standard input")
+        parser.add_argument("--author", type=str, help="Username of the author of every article, else of each record")
+        parser.add_argument("--chunk-size", type=int, default=500, help="Articles written per transaction")
+
+    def handle(self, *args, **options) -> None:
+        author = None
+        if options["author"]:
+            author = get_user_model().objects.filter(username=options["author"]).first()
+            if author is None:
+                raise CommandError(f"Unknown author: {options['author']}")
+        stream = sys.stdin.buffer if options["path"] == "-" else Path(options["path"]).open("rb")
+        try:
+            with stream:
+                report = import_articles(read_records(stream), author=author, chunk_size=options["chunk_size"])
+        except json.JSONDecodeError as err:
+            raise CommandError(f"Invalid JSON: {err}") from err
+        for error in report.errors:
+            self.stderr.write(f"Skipped record {error['record']}: {error['error']}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {report.imported} articles in {report.seconds:.2f}s ({report.per_second:.0f} articles/s), "
+                f"skipped {len(report.errors)}."
+            )
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from articles import timeline
+
+
+class Command(BaseCommand):
+    help = "Rebuild the personal feed timelines from scratch, e.g. after changing FEED_FANOUT_MAX_FOLLOWERS"
+
+    def handle(self, *args, **options) -> None:
+        timeline.rebuild()
+        self.stdout.write(self.style.SUCCESS("Rebuilt the personal feed timelines."))
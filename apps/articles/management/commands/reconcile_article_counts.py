@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from articles import counters
+
+
+class Command(BaseCommand):
+    help = "Rebuild the articlesCount counters from scratch"
+
+    def handle(self, *args, **options) -> None:
+        written = counters.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} article counters."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandParser
+
+from articles import rendering
+from articles.models import Article
+
+
+class Command(BaseCommand):
+    help = "Render the HTML body of every article again, e.g. after changing the markdown extensions"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--processes", type=int, help="Worker processes, one per CPU by default, 0 for none")
+        parser.add_argument("--chunk-size", type=int, default=200, help="Articles rendered per task")
+
+    def handle(self, *args, **options) -> None:
+        rendered = rendering.rerender(Article.objects.all(), options["processes"], options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rendered the body of {rendered} articles."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from articles import counters
+
+
+class Command(BaseCommand):
+    help = "Fix the stored favorites counts of the articles that drifted from the favorites table"
+
+    def handle(self, *args, **options) -> None:
+        fixed = counters.repair_favorites_counts()
+        self.stdout.write(self.style.SUCCESS(f"Fixed the favorites count of {fixed} articles."))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("articles", "0004_drop_taggit_tables"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="article",
+            index=models.Index(fields=["-created", "-id"], name="article_created_id_idx"),
+        ),
+    ]
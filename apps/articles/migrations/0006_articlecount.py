@@ -0,0 +1,49 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:12
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_existing_articles(apps, schema_editor):
+    """Initialize the counters that `articles.signals` then keeps up to date."""
+    Article = apps.get_model("articles", "Article")
+    ArticleCount = apps.get_model("articles", "ArticleCount")
+    counts = [ArticleCount(scope="all", ref_id=0, value=Article.objects.count())]
+    for scope, through, field in (
+        ("author", Article, "author_id"),
+        ("tag", Article.tags.through, "tag_id"),
+        ("favorited", Article.favorites.through, "user_id"),
+    ):
+        rows = through.objects.values(field).annotate(n=Count("id")).order_by()
+        counts.extend(ArticleCount(scope=scope, ref_id=row[field], value=row["n"]) for row in rows)
+    ArticleCount.objects.bulk_create(counts)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("articles", "0005_article_created_id_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArticleCount",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "scope",
+                    models.CharField(
+                        choices=[("all", "All"), ("tag", "Tag"), ("author", "Author"), ("favorited", "Favorited")],
+                        max_length=10,
+                    ),
+                ),
+                ("ref_id", models.BigIntegerField(default=0)),
+                ("value", models.BigIntegerField(default=0)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(fields=("scope", "ref_id"), name="unique_article_count_scope_ref")
+                ],
+            },
+        ),
+        migrations.RunPython(count_existing_articles, migrations.RunPython.noop),
+    ]
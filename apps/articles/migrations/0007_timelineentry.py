@@ -0,0 +1,55 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_timelines(apps, schema_editor):
+    """Push existing articles to the timelines of the followers of their authors, as `articles.timeline` would."""
+    Article = apps.get_model("articles", "Article")
+    TimelineEntry = apps.get_model("articles", "TimelineEntry")
+    Follow = apps.get_model(*settings.AUTH_USER_MODEL.split(".")).followers.through
+    authors = Follow.objects.values("from_user_id").annotate(n=Count("id")).order_by()
+    for row in authors.filter(n__lte=settings.FEED_FANOUT_MAX_FOLLOWERS):
+        article_ids = list(Article.objects.filter(author_id=row["from_user_id"]).values_list("id", flat=True))
+        follower_ids = Follow.objects.filter(from_user_id=row["from_user_id"]).values_list("to_user_id", flat=True)
+        entries = (TimelineEntry(user_id=f, article_id=a) for f in follower_ids for a in article_ids)
+        TimelineEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("articles", "0006_articlecount"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TimelineEntry",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "article",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="timeline_entries",
+                        to="articles.article",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="timeline_entries",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [models.UniqueConstraint(fields=("user", "article"), name="unique_timeline_entry")],
+            },
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:15
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_existing_favorites(apps, schema_editor):
+    Article = apps.get_model("articles", "Article")
+    favorites = Article.favorites.through.objects.filter(article_id=OuterRef("pk")).values("article_id")
+    Article.objects.update(favorites_count=Coalesce(Subquery(favorites.annotate(n=Count("id")).values("n")), 0))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("articles", "0007_timelineentry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="article",
+            name="favorites_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_existing_favorites, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("articles", "0008_article_favorites_count"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="articlecount",
+            index=models.Index(fields=["scope", "-value"], name="article_count_scope_value_idx"),
+        ),
+    ]
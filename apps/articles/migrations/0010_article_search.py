@@ -0,0 +1,46 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:26
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+POSTGRESQL_VECTOR = (
+    "setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', summary), 'B') || "
+    "setweight(to_tsvector('english', content), 'C')"
+)
+
+
+def create_search_index(apps, schema_editor):
+    """A GIN index on PostgreSQL, an FTS5 table on SQLite, both filled from the existing articles."""
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(f"UPDATE articles_article SET search_vector = {POSTGRESQL_VECTOR}")
+        schema_editor.execute("CREATE INDEX article_search_vector_idx ON articles_article USING gin (search_vector)")
+    else:
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE articles_article_fts USING fts5(title, summary, content, tokenize='porter unicode61')"
+        )
+        schema_editor.execute(
+            "INSERT INTO articles_article_fts (rowid, title, summary, content) "
+            "SELECT id, title, summary, content FROM articles_article"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX article_search_vector_idx")
+    else:
+        schema_editor.execute("DROP TABLE articles_article_fts")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("articles", "0009_article_count_scope_value_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="article",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:42
+
+from django.db import migrations, models
+
+from articles import rendering
+
+
+def render_existing_bodies(apps, schema_editor):
+    rendering.rerender(apps.get_model("articles", "Article").objects.using(schema_editor.connection.alias), processes=0)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("articles", "0010_article_search"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="article",
+            name="body_html",
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(render_existing_bodies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("articles", "0011_article_body_html"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="article",
+            name="comments_count",
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:05
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_article_dates(apps, schema_editor):
+    """Date the entries as their articles, and drop those of the pulled authors, now merged into feeds when read."""
+    Article = apps.get_model("articles", "Article")
+    TimelineEntry = apps.get_model("articles", "TimelineEntry")
+    TimelineEntry.objects.filter(article__author__feed_pulled=True).delete()
+    TimelineEntry.objects.update(created=Subquery(Article.objects.filter(pk=OuterRef("article_id")).values("created")))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0004_user_feed_pulled"),
+        ("articles", "0012_article_comments_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="timelineentry",
+            name="created",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_article_dates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="timelineentry",
+            index=models.Index(fields=["user", "-created", "-article"], name="timeline_user_created_idx"),
+        ),
+    ]
@@ -1,19 +1,40 @@
+import re
 import uuid
+from collections.abc import Iterable
 from typing import Self
 
-import markdown
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db import IntegrityError, models, transaction
 from django.utils.text import slugify
 
+from articles import rendering
+from helpers.exceptions import clean_integrity_error
+
 User = get_user_model()
+SLUG_ATTEMPTS = 3  # A second conflict would need two random suffixes to collide
+
+
+class TagQuerySet(models.QuerySet):
+    def upsert(self, names: Iterable[str]) -> dict[str, int]:
+        """Ids of the tags named `names`, by name, creating the missing ones: one insert and one select"""
+        names = set(names)
+        if not names:
+            return {}
+        self.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+        return dict(self.filter(name__in=names).values_list("name", "id"))
+
+
+TagManager = models.Manager.from_queryset(TagQuerySet)
 
 
 class Tag(models.Model):
     name = models.CharField(max_length=100, unique=True)
 
+    objects = TagManager()
+
     def __str__(self) -> str:
         return self.name
 
@@ -21,7 +42,6 @@ class Tag(models.Model):
 class ArticleQuerySet(models.QuerySet):
     def with_favorites(self, user: AnonymousUser | User) -> Self:
         return self.annotate(
-            num_favorites=models.Count("favorites"),
             is_favorite=(
                 models.Exists(get_user_model().objects.filter(pk=user.id, favorites=models.OuterRef("pk")))
                 if user.is_authenticated
@@ -45,15 +65,73 @@ class Article(models.Model):
     tags = models.ManyToManyField(Tag, blank=True)
     favorites = models.ManyToManyField(settings.AUTH_USER_MODEL, blank=True, related_name="favorites")
     slug = models.SlugField(unique=True, max_length=255)  # Not a property as used for lookup
+    favorites_count = models.IntegerField(default=0)  # Kept in sync with `favorites` by `articles.signals`
+    comments_count = models.IntegerField(default=0)  # Kept in sync with the comments by `comments.signals`
+    search_vector = SearchVectorField(null=True, editable=False)  # PostgreSQL only, see `articles.search`
+    body_html = models.TextField(blank=True, editable=False)  # `content` rendered by `articles.rendering`
 
     objects = ArticleManager()
 
+    class Meta:
+        indexes = [models.Index(fields=["-created", "-id"], name="article_created_id_idx")]  # keyset pagination
+
     def save(self, *args, **kwargs) -> None:
-        self.slug = slugify(self.title)
-        if Article.objects.filter(slug=self.slug).exclude(pk=self.pk).exists():
-            self.slug = f"{self.slug}-{uuid.uuid4().hex[:8]}"
-        super().save(*args, **kwargs)
+        """
+        The slug follows the title, and is left untouched by saves that don't write the title. Its uniqueness is only
+        checked by the database constraint: on conflict, the write is retried in a savepoint with a random suffix.
+        The HTML body is rendered again by the saves that write the content.
+        """
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "content" in update_fields:
+            self.body_html = rendering.render(self.content)
+            if update_fields is not None:
+                update_fields = kwargs["update_fields"] = {*update_fields, "body_html"}
+        if update_fields is not None:
+            if not {"title", "slug"} & set(update_fields):
+                return super().save(*args, **kwargs)
+            kwargs["update_fields"] = {*update_fields, "slug"}
+        base = slugify(self.title)
+        if self._state.adding or not re.fullmatch(rf"{re.escape(base)}(-[0-9a-f]{{8}})?", self.slug):
+            self.slug = base
+        for attempt in range(SLUG_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError as err:
+                if attempt == SLUG_ATTEMPTS - 1 or clean_integrity_error(err) != "slug":
+                    raise
+                self.slug = f"{base}-{uuid.uuid4().hex[:8]}"
 
     def as_markdown(self) -> str:
-        """Unused here as we are consumed by a SPA"""
-        return markdown.markdown(self.content, safe_mode="escape", extensions=["extra"])
+        """Rendered from the current `content`, while `body_html` is what was rendered on the last save"""
+        return rendering.render(self.content)
+
+
+class ArticleCount(models.Model):
+    """Number of articles matching one of the list filters, maintained incrementally by `articles.counters`"""
+
+    class Scope(models.TextChoices):
+        ALL = "all"
+        TAG = "tag"
+        AUTHOR = "author"
+        FAVORITED = "favorited"
+
+    scope = models.CharField(max_length=10, choices=Scope.choices)
+    ref_id = models.BigIntegerField(default=0)  # Tag or User id depending on the scope, 0 for `Scope.ALL`
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["scope", "ref_id"], name="unique_article_count_scope_ref")]
+        indexes = [models.Index(fields=["scope", "-value"], name="article_count_scope_value_idx")]  # Popular tags
+
+
+class TimelineEntry(models.Model):
+    """An article pushed to the personal feed of a follower of its author, see `articles.timeline`"""
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="timeline_entries")
+    article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name="timeline_entries")
+    created = models.DateTimeField()  # That of the article, so that feeds are paginated from their entries alone
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["user", "article"], name="unique_timeline_entry")]
+        indexes = [models.Index(fields=["user", "-created", "-article"], name="timeline_user_created_idx")]
@@ -1,16 +1,22 @@
 from datetime import datetime
+from typing import Any, Self
 
-from accounts.schemas import ProfileSchema
+from accounts.schemas import AuthorSchema, ProfileSchema
+from accounts.viewer import get_viewer
+from django.http import HttpRequest
 from ninja import Field, ModelSchema, Schema
 from pydantic import SerializeAsAny, field_validator
 
+from articles import loaders
 from articles.models import Article
 from helpers.empty import EMPTY
+from helpers.loaders import get_loader, request_from
 
 
-class ArticleOutSchema(ModelSchema):
+class ArticleListOutSchema(ModelSchema):
+    """Articles in lists don't have a `body`, so it's not even loaded"""
+
     description: str = Field(alias="summary")
-    body: str = Field(alias="content")
     createdAt: datetime = Field(alias="created")
     updatedAt: datetime = Field(alias="updated")
     favorited: bool
@@ -23,20 +29,80 @@ class ArticleOutSchema(ModelSchema):
         fields = ["slug", "title"]
 
     @staticmethod
-    def resolve_favorited(obj: Article) -> bool:
+    def resolve_favorited(obj: Article, context: dict[str, Any] | None) -> bool:
+        if request := request_from(context):
+            return get_viewer(request).favorited(obj.id)
         return obj.is_favorite
 
     @staticmethod
     def resolve_favoritesCount(obj: Article) -> int:
-        return obj.num_favorites
+        return obj.favorites_count
 
     @staticmethod
-    def resolve_tagList(obj: Article) -> list[str]:
+    def resolve_tagList(obj: Article, context: dict[str, Any] | None) -> list[str]:
+        if request := request_from(context):
+            return get_loader(request, loaders.tag_names).load(obj.id)
         return sorted(t.name for t in obj.tags.all())
 
+    @classmethod
+    def from_trusted(cls, obj: Article, request: HttpRequest) -> Self:
+        """
+        What `from_orm` would output for an article loaded by the view, without validating it: the fast path of lists.
+        The view must have primed the loaders, as this reads the same.
+        """
+        return cls.model_construct(
+            description=obj.summary,
+            createdAt=obj.created,
+            updatedAt=obj.updated,
+            favorited=get_viewer(request).favorited(obj.id),
+            favoritesCount=obj.favorites_count,
+            author=ProfileSchema.from_trusted(obj.author, request),
+            tagList=get_loader(request, loaders.tag_names).load(obj.id),
+            slug=obj.slug,
+            title=obj.title,
+        )
+
+
+class ArticleListCountsOutSchema(ArticleListOutSchema):
+    """With the number of comments of each article, on request"""
+
+    commentsCount: int = Field(alias="comments_count")
+
+    @classmethod
+    def from_trusted(cls, obj: Article, request: HttpRequest) -> Self:
+        article = super().from_trusted(obj, request)
+        article.commentsCount = obj.comments_count
+        return article
+
+
+class ArticleOutSchema(ArticleListOutSchema):
+    body: str = Field(alias="content")
+
+
+class ArticleHtmlOutSchema(ArticleOutSchema):
+    """With the body also rendered as HTML, on request"""
+
+    bodyHtml: str = Field(alias="body_html")
+
 
-class ArticleListOutSchema(ArticleOutSchema):
-    body: str = Field(alias="content", exclude=True)
+class ArticleExportSchema(ModelSchema):
+    """Lines of `export_articles`, with the id to resume from, tags being prefetched"""
+
+    description: str = Field(alias="summary")
+    body: str = Field(alias="content")
+    createdAt: datetime = Field(alias="created")
+    updatedAt: datetime = Field(alias="updated")
+    favoritesCount: int = Field(alias="favorites_count")
+    author: AuthorSchema
+    tagList: list[str]
+
+    class Meta:
+        model = Article
+        fields = ["id", "slug", "title"]
+
+    @staticmethod
+    def resolve_tagList(obj: Article) -> list[str]:
+        return sorted(t.name for t in obj.tags.all())
 
 
 class ArticleInCreateSchema(Schema):
@@ -0,0 +1,83 @@
+"""
+Full-text search over the title, summary and content of articles, in that order of weight.
+On PostgreSQL this is the GIN-indexed `Article.search_vector` column, on SQLite an FTS5 shadow table.
+`index` and `unindex` keep them in sync, they are called by the signal handlers on article saves and deletes.
+Both indexes are created by the `0010_article_search` migration, which fills them for existing articles.
+"""
+
+from collections.abc import Iterable
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections
+from django.db.models import F, QuerySet
+from django.db.models.expressions import RawSQL
+
+from articles.models import Article
+
+CONFIG = "english"
+FTS_TABLE = "articles_article_fts"
+FTS_WEIGHTS = (10.0, 4.0, 1.0)  # bm25 weights of the title, summary and content columns
+
+
+def _is_postgresql(using: str) -> bool:
+    return connections[using].vendor == "postgresql"
+
+
+def vector() -> SearchVector:
+    return (
+        SearchVector("title", weight="A", config=CONFIG)
+        + SearchVector("summary", weight="B", config=CONFIG)
+        + SearchVector("content", weight="C", config=CONFIG)
+    )
+
+
+def index(article_ids: Iterable[int], using: str = "default") -> None:
+    """(Re)index these articles from their current values in the database"""
+    article_ids = list(article_ids)
+    if not article_ids:
+        return
+    if _is_postgresql(using):
+        Article.objects.using(using).filter(pk__in=article_ids).update(search_vector=vector())
+        return
+    unindex(article_ids, using)
+    placeholders = ", ".join(["%s"] * len(article_ids))
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, summary, content) "
+            f"SELECT id, title, summary, content FROM {Article._meta.db_table} WHERE id IN ({placeholders})",
+            article_ids,
+        )
+
+
+def unindex(article_ids: Iterable[int], using: str = "default") -> None:
+    """Drop deleted articles from the FTS5 table, their PostgreSQL vector being deleted with them"""
+    article_ids = list(article_ids)
+    if not article_ids or _is_postgresql(using):
+        return
+    placeholders = ", ".join(["%s"] * len(article_ids))
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", article_ids)
+
+
+def _fts_query(q: str) -> str:
+    """Every word as a quoted FTS5 string, so that user input can't be parsed as query syntax"""
+    return " ".join('"{}"'.format(word.replace('"', '""')) for word in q.split())
+
+
+def search(queryset: QuerySet, q: str) -> QuerySet:
+    """Articles of `queryset` matching all the words of `q`, annotated with their `rank`, the higher the better"""
+    if _is_postgresql(queryset.db):
+        query = SearchQuery(q, search_type="websearch", config=CONFIG)
+        return queryset.filter(search_vector=query).annotate(rank=SearchRank(F("search_vector"), query))
+    fts_query = _fts_query(q)
+    if not fts_query:
+        return queryset.none()
+    table = Article._meta.db_table
+    matches = RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [fts_query])
+    weights = ", ".join(str(weight) for weight in FTS_WEIGHTS)
+    rank = RawSQL(
+        f"SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} "
+        f"WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = {table}.id",
+        [fts_query],
+    )
+    return queryset.filter(id__in=matches).annotate(rank=rank)
@@ -0,0 +1,190 @@
+"""
+Signal handlers keeping the denormalized article data in sync, inside the transaction of each write,
+and invalidating the cached responses that depend on it.
+"""
+
+from typing import Any
+
+from django.contrib.auth import get_user_model
+from django.db.models import F, Model
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from articles import cache_scopes, counters, search, timeline
+from articles.models import Article, ArticleCount, Tag
+from helpers.cache import invalidate
+
+User = get_user_model()
+Scope = ArticleCount.Scope
+
+
+@receiver(post_save, sender=Article)
+def count_created_article(sender: type[Article], instance: Article, created: bool, **kwargs: Any) -> None:
+    if created:
+        counters.adjust(Scope.ALL, {0: 1})
+        counters.adjust(Scope.AUTHOR, {instance.author_id: 1})
+        timeline.fan_out([instance])
+
+
+@receiver(post_save, sender=Article)
+def invalidate_saved_article(
+    sender: type[Article], instance: Article, created: bool, update_fields: frozenset | None, **kwargs: Any
+) -> None:
+    if created:  # Not tagged nor favorited yet
+        invalidate(cache_scopes.ALL, cache_scopes.author(instance.author.username))
+    else:  # Edits can show on any list, and are rare enough to move them all
+        invalidate(cache_scopes.ARTICLES)
+    if not created and (update_fields is None or "slug" in update_fields):
+        invalidate("comments")  # Comments cached under the previous slug, which isn't known anymore
+
+
+@receiver(post_save, sender=Article)
+def index_saved_article(
+    sender: type[Article], instance: Article, update_fields: frozenset | None, using: str, **kwargs: Any
+) -> None:
+    if update_fields is None or {"title", "summary", "content"} & update_fields:
+        search.index([instance.pk], using)
+
+
+@receiver(post_delete, sender=Article)
+def unindex_deleted_article(sender: type[Article], instance: Article, using: str, **kwargs: Any) -> None:
+    search.unindex([instance.pk], using)
+
+
+@receiver(pre_delete, sender=Article)
+def remember_deleted_article_relations(sender: type[Article], instance: Article, **kwargs: Any) -> None:
+    """The through rows are gone by `post_delete`, and their deletion doesn't send `m2m_changed`"""
+    instance._counted_tag_ids = list(instance.tags.values_list("id", flat=True))
+    instance._counted_favoriter_ids = list(instance.favorites.values_list("id", flat=True))
+    instance._cache_scopes = cache_scopes.article_scopes([instance.pk])
+
+
+@receiver(post_delete, sender=Article)
+def uncount_deleted_article(sender: type[Article], instance: Article, **kwargs: Any) -> None:
+    counters.adjust(Scope.ALL, {0: -1})
+    counters.adjust(Scope.AUTHOR, {instance.author_id: -1})
+    counters.adjust(Scope.TAG, dict.fromkeys(getattr(instance, "_counted_tag_ids", []), -1))
+    counters.adjust(Scope.FAVORITED, dict.fromkeys(getattr(instance, "_counted_favoriter_ids", []), -1))
+    scopes = getattr(instance, "_cache_scopes", [cache_scopes.ARTICLES])
+    invalidate(*scopes, "tags", f"comments:{instance.slug}")
+
+
+def _existing_ids(through: type[Model], field: str, instance: Model, reverse: bool, pk_set: set | None) -> list[int]:
+    """Ids on the other side of the rows that a remove or clear is about to delete"""
+    if reverse:
+        queryset = through.objects.filter(**{field: instance.pk})
+        queryset = queryset.filter(article_id__in=pk_set) if pk_set is not None else queryset
+        return list(queryset.values_list("article_id", flat=True))
+    queryset = through.objects.filter(article_id=instance.pk)
+    queryset = queryset.filter(**{f"{field}__in": pk_set}) if pk_set is not None else queryset
+    return list(queryset.values_list(field, flat=True))
+
+
+def _m2m_change(
+    field: str,
+    sender: type[Model],
+    instance: Model,
+    action: str,
+    reverse: bool,
+    pk_set: set | None,
+    **kwargs: Any,
+) -> tuple[list[int], int] | None:
+    """
+    Once the change is done, returns the ids on the other side of the added or removed rows, and 1 or -1.
+    `pk_set` only holds really added ids on `post_add`, but on removal it holds whatever was asked for,
+    so the rows that will actually be deleted are looked up before.
+    """
+    pending = instance.__dict__.setdefault("_counted_m2m_ids", {})
+    if action in ("pre_remove", "pre_clear"):
+        pending[sender] = _existing_ids(sender, field, instance, reverse, pk_set)
+        return None
+    if action == "post_add":
+        ids, delta = list(pk_set or ()), 1
+    elif action in ("post_remove", "post_clear"):
+        ids, delta = pending.pop(sender, []), -1
+    else:
+        return None
+    return (ids, delta) if ids else None
+
+
+def _deltas(instance: Model, reverse: bool, ids: list[int], delta: int) -> dict[int, int]:
+    """Deltas for the counters of the side that isn't the article"""
+    return {instance.pk: delta * len(ids)} if reverse else dict.fromkeys(ids, delta)
+
+
+@receiver(m2m_changed, sender=Article.tags.through)
+def count_tags_change(sender: type[Model], instance: Model, reverse: bool, **kwargs: Any) -> None:
+    if change := _m2m_change("tag_id", sender, instance, reverse=reverse, **kwargs):
+        counters.adjust(Scope.TAG, _deltas(instance, reverse, *change))
+        if reverse:  # The articles of a tag, changed in bulk
+            invalidate(cache_scopes.ARTICLES, "tags")
+            return
+        names = Tag.objects.filter(id__in=change[0]).values_list("name", flat=True)
+        invalidate(*cache_scopes.article_scopes([instance.pk]), *cache_scopes.tag_scopes(names), "tags")
+
+
+@receiver(m2m_changed, sender=Article.favorites.through)
+def count_favorites_change(sender: type[Model], instance: Model, reverse: bool, **kwargs: Any) -> None:
+    if change := _m2m_change("user_id", sender, instance, reverse=reverse, **kwargs):
+        ids, delta = change
+        counters.adjust(Scope.FAVORITED, _deltas(instance, reverse, ids, delta))
+        articles = Article.objects.filter(pk__in=ids) if reverse else Article.objects.filter(pk=instance.pk)
+        articles.update(favorites_count=F("favorites_count") + (delta if reverse else delta * len(ids)))
+        # The unfavoriting users aren't read by `article_scopes` anymore
+        users = [instance] if reverse else User.objects.filter(id__in=ids)
+        article_ids = ids if reverse else [instance.pk]
+        invalidate(
+            *cache_scopes.article_scopes(article_ids), *cache_scopes.favorited_scopes(user.username for user in users)
+        )
+
+
+@receiver(post_save, sender=Tag)
+def invalidate_saved_tag(sender: type[Tag], instance: Tag, **kwargs: Any) -> None:
+    invalidate("tags", cache_scopes.ARTICLES)
+
+
+@receiver(post_delete, sender=Tag)
+def forget_deleted_tag(sender: type[Tag], instance: Tag, **kwargs: Any) -> None:
+    counters.forget(Scope.TAG, instance.pk)
+    invalidate("tags", cache_scopes.ARTICLES)
+
+
+@receiver(pre_delete, sender=User)
+def remember_deleted_user_favorites(sender: type[Model], instance: Model, **kwargs: Any) -> None:
+    instance._favorited_article_ids = list(instance.favorites.values_list("id", flat=True))
+
+
+@receiver(post_delete, sender=User)
+def forget_deleted_user(sender: type[Model], instance: Model, **kwargs: Any) -> None:
+    """Their favorites are cascade-deleted without `m2m_changed`, and their articles already uncounted themselves"""
+    counters.forget(Scope.AUTHOR, instance.pk)
+    counters.forget(Scope.FAVORITED, instance.pk)
+    favorited_articles = Article.objects.filter(pk__in=getattr(instance, "_favorited_article_ids", []))
+    favorited_articles.update(favorites_count=F("favorites_count") - 1)
+    invalidate(cache_scopes.ARTICLES, "comments")
+
+
+@receiver(post_save, sender=User)
+def invalidate_saved_profile(
+    sender: type[Model], instance: Model, created: bool, update_fields: frozenset | None, **kwargs: Any
+) -> None:
+    """Authors are nested in articles and comments, but logins only update `last_login`"""
+    if not created and (update_fields is None or {"username", "bio", "image"} & update_fields):
+        invalidate(cache_scopes.ARTICLES, "comments")
+
+
+@receiver(m2m_changed, sender=User.followers.through)
+def update_timelines(
+    sender: type[Model], instance: Model, action: str, reverse: bool, pk_set: set | None, **kwargs: Any
+) -> None:
+    if action in ("pre_remove", "pre_clear"):
+        if pk_set is None:
+            follows = sender.objects.filter(**{"to_user_id" if reverse else "from_user_id": instance.pk})
+            pairs = list(follows.values_list("from_user_id", "to_user_id"))
+        else:
+            pairs = [(pk, instance.pk) if reverse else (instance.pk, pk) for pk in pk_set]
+        instance._unfollowed = pairs, timeline.pulled_author_ids({author_id for author_id, _ in pairs})
+    elif action in ("post_remove", "post_clear"):
+        timeline.unfollow(*instance.__dict__.pop("_unfollowed"))
+    elif action == "post_add":
+        timeline.follow([(pk, instance.pk) if reverse else (instance.pk, pk) for pk in pk_set or ()])
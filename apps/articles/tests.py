@@ -1,15 +1,37 @@
+import contextlib
+import io
+import json
 import re
+import tempfile
+import threading
+import uuid
+import warnings
+from datetime import UTC, date, datetime, timedelta, timezone
+from decimal import Decimal
 from json import loads
 from unittest import mock
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
-from ninja.testing import TestClient
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date
+from django.utils.text import slugify
+from ninja.renderers import JSONRenderer
 from parameterized import parameterized
 
+from articles import counters, imports, loaders, rendering, search
 from articles.api import router
-from articles.models import Article, Tag
+from articles.models import Article, ArticleCount, Tag, TimelineEntry
+from articles.schemas import ArticleListOutSchema
+from config.urls import api
 from helpers.jwt_utils import create_jwt_token
+from helpers.projection import project
+from helpers.renderers import ORJSONRenderer
+from helpers.testing import TestClient
 
 User = get_user_model()
 
@@ -111,6 +133,34 @@ class ArticleViewSetTest(TestCase):
         self.assertEqual(response.data.get("articles", None), [self.article_list_out])
         self._valid_timestamps_in_output_dict(response.data.get("articles", None)[0])
 
+    def test_get_articles_with_cursor(self):
+        response = self.client.get("/articles?limit=1&cursor=", user=self.user)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["articles"], [self.other_article_list_out])
+        self.assertEqual(response.data["articlesCount"], 2)
+        next_cursor = response.data["nextCursor"]
+        self.assertIsInstance(next_cursor, str)
+        response = self.client.get(f"/articles?limit=1&cursor={next_cursor}", user=self.user)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["articles"], [self.article_list_out])
+        self.assertIsNone(response.data["nextCursor"])
+
+    def test_get_articles_with_cursor_keeps_order_on_identical_timestamps(self):
+        Article.objects.update(created=self.article.created)
+        response = self.client.get("/articles?limit=1&cursor=", user=self.user)
+        slugs = [a["slug"] for a in response.data["articles"]]
+        response = self.client.get(f"/articles?limit=1&cursor={response.data['nextCursor']}", user=self.user)
+        slugs += [a["slug"] for a in response.data["articles"]]
+        self.assertEqual(slugs, ["other-test-title", "test-title"])
+
+    def test_get_articles_with_invalid_cursor(self):
+        response = self.client.get("/articles?cursor=not-a-cursor", user=self.user)
+        self.assertEqual(response.status_code, 422)
+
+    def test_get_articles_without_cursor_has_no_next_cursor(self):
+        response = self.client.get("/articles?limit=1", user=self.user)
+        self.assertNotIn("nextCursor", response.data)
+
     def test_get_article_feed_no_filter(self):
         response = self.client.get("/articles/feed", user=self.user)
         self.assertEqual(response.status_code, 200)
@@ -178,6 +228,20 @@ class ArticleViewSetTest(TestCase):
         self.assertEqual(response.data["articles"][0]["slug"], "other-test-title")  # the older article
         self._valid_timestamps_in_output_dict(loads(response.content)["articles"][0])
 
+    def test_get_article_feed_with_cursor(self):
+        extra_user = User.objects.create_user(username="extrauser", email="extra@email.test", password="testpass")
+        Article.objects.create(author=extra_user, title="Extra Test Title", summary="-", content="-", slug="-")
+        extra_user.followers.add(self.user)
+
+        response = self.client.get("/articles/feed?limit=1&cursor=", user=self.user)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["articlesCount"], 2)
+        self.assertEqual([a["slug"] for a in response.data["articles"]], ["extra-test-title"])
+        response = self.client.get(f"/articles/feed?limit=1&cursor={response.data['nextCursor']}", user=self.user)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([a["slug"] for a in response.data["articles"]], ["other-test-title"])
+        self.assertIsNone(response.data["nextCursor"])
+
     def test_get_article_feed_ko(self):
         self.client.headers["Authorization"] = None
         response = self.client.get("/articles/feed", user=None)
@@ -225,6 +289,10 @@ class ArticleViewSetTest(TestCase):
                 "summary": "New Test Description",
                 "title": "New Test Title",
                 "updated": mock.ANY,
+                "favorites_count": 0,
+                "comments_count": 0,
+                "search_vector": mock.ANY,
+                "body_html": "<p>New Test Content</p>",
             },
         )
         self.assertEqual(set(Article.objects.last().tags.values_list("name", flat=True)), {"tag", "taag", "taaag"})
@@ -270,6 +338,10 @@ class ArticleViewSetTest(TestCase):
                 "summary": "New Test Description",
                 "title": "New Test Title",
                 "updated": mock.ANY,
+                "favorites_count": 0,
+                "comments_count": 0,
+                "search_vector": mock.ANY,
+                "body_html": "<p>New Test Content</p>",
             },
         )
         self.assertEqual(set(Article.objects.last().tags.values_list("name", flat=True)), set())
@@ -328,6 +400,44 @@ class ArticleViewSetTest(TestCase):
         self.assertEqual(response.data, {"article": self.article_out})
         self._valid_timestamps_in_output_dict(response.data["article"])
 
+    def test_export_articles(self):
+        with self.assertNumQueries(4):  # Auth, then one chunk of articles with their authors, and their tags
+            response = self.client.get("/export/articles")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response._response["Content-Type"], "application/x-ndjson")
+        lines = [loads(line) for line in response.content.splitlines()]
+        profile = {"username": "otheruser", "bio": None, "image": None}
+        other_out = {k: v for k, v in self.other_article_out.items() if k != "favorited"}
+        self.assertEqual(lines[1], {**other_out, "id": self.other_article.id, "author": profile})
+        self.assertEqual([line["id"] for line in lines], [self.article.id, self.other_article.id])
+        response = self.client.get("/export/articles", query_params={"after": self.article.id})
+        self.assertEqual([loads(line)["id"] for line in response.content.splitlines()], [self.other_article.id])
+
+    def test_get_article_not_modified(self):
+        response = self.client.get(f"/articles/{self.article.slug}")
+        etag = response["ETag"]
+        self.assertNotIn("Last-Modified", response._response)
+        with self.assertNumQueries(2):  # The article without its body, then the favorite and follow, auth being cached
+            response = self.client.get(f"/articles/{self.article.slug}", headers={"IF-NONE-MATCH": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], etag)
+        self.article.favorites.add(self.other_user)  # Changes the body, but not `updated`
+        response = self.client.get(f"/articles/{self.article.slug}", headers={"IF-MODIFIED-SINCE": http_date()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["article"]["favoritesCount"], 1)
+
+    def test_get_article_modified(self):
+        etag = self.client.get(f"/articles/{self.article.slug}")["ETag"]
+        self.article.favorites.add(self.other_user)
+        response = self.client.get(f"/articles/{self.article.slug}", headers={"IF-NONE-MATCH": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {"article": {**self.article_out, "favoritesCount": 1}})
+        self.assertNotEqual(response["ETag"], etag)
+        self.client.headers = {"Content-Type": "application/json"}
+        response = self.client.get(f"/articles/{self.article.slug}", headers={"IF-NONE-MATCH": etag})
+        self.assertEqual(response.status_code, 200)  # Another viewer
+
     def test_update_article(self):
         update_article_data = {
             "article": {
@@ -364,6 +474,10 @@ class ArticleViewSetTest(TestCase):
                 "summary": "New Test Description",
                 "title": "New Test Title",
                 "updated": mock.ANY,
+                "favorites_count": 0,
+                "comments_count": 0,
+                "search_vector": mock.ANY,
+                "body_html": "<p>New Test Content</p>",
             },
         )
 
@@ -404,10 +518,35 @@ class ArticleViewSetTest(TestCase):
                 "title": "Test Title",
                 "summary": "Test summary",
                 "content": "Test content",
+                "favorites_count": 0,
+                "comments_count": 0,
+                "search_vector": mock.ANY,
+                "body_html": "<p>{}</p>".format(updated_data if updated_db_key == "content" else "Test content"),
                 updated_db_key: updated_data,
             },
         )
 
+    def test_article_tags_cost_constant_queries(self):
+        def queries(tags):
+            with CaptureQueriesContext(connection) as context:
+                self.client.put(f"/articles/{self.other_article.slug}", json={"article": {"tagList": tags}})
+            return len(context.captured_queries)
+
+        self.client.headers["Authorization"] = f"Token {create_jwt_token(self.other_user)}"
+        self.client.get("/articles/feed")  # So that the auth is cached for all the measured requests
+        self.assertEqual(queries(["new"]), queries([f"tag{i}" for i in range(10)]))  # Replacing 1 tag, then 1 by 10
+        self.assertEqual(sorted(self.other_article.tags.values_list("name", flat=True)), [f"tag{i}" for i in range(10)])
+        with CaptureQueriesContext(connection) as one_tag:
+            self.client.post(
+                "/articles", json={"article": {"title": "A", "description": "-", "body": "-", "tagList": ["a"]}}
+            )
+        with CaptureQueriesContext(connection) as ten_tags:
+            tags = [f"new{i}" for i in range(10)]
+            self.client.post(
+                "/articles", json={"article": {"title": "B", "description": "-", "body": "-", "tagList": tags}}
+            )
+        self.assertEqual(len(one_tag.captured_queries), len(ten_tags.captured_queries))
+
     def test_update_article_invalid_data_additional_field_still_works(self):
         update_article_data = {
             "article": {
@@ -474,6 +613,650 @@ class ArticleViewSetTest(TestCase):
         self._valid_timestamps_in_output_dict(response.data["article"])
         self.assertEqual(self.article.favorites.count(), 0)
 
+    def test_favorite_article_twice(self):
+        self.client.post(f"/articles/{self.article.slug}/favorite")
+        response = self.client.post(f"/articles/{self.article.slug}/favorite")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data, {"errors": {"body": ["Already Favourited Article"]}})
+        self.assertEqual(Article.objects.get(pk=self.article.pk).favorites_count, 1)
+        self.assertEqual(counters.read(ArticleCount.Scope.FAVORITED, [self.user.id]), 1)
+
+    def test_unfavorite_article_not_favorited(self):
+        response = self.client.delete(f"/articles/{self.article.slug}/favorite")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Article.objects.get(pk=self.article.pk).favorites_count, 0)
+
+    def test_favorite_does_not_read_the_article_again(self):
+        with CaptureQueriesContext(connection) as context:
+            self.client.post(f"/articles/{self.other_article.slug}/favorite")
+        article_reads = [q for q in context.captured_queries if q["sql"].startswith('SELECT "articles_article"')]
+        self.assertEqual(len(article_reads), 1)
+        self.assertEqual(counters.read(ArticleCount.Scope.FAVORITED, [self.user.id]), 1)
+        response = self.client.delete(f"/articles/{self.other_article.slug}/favorite")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {"article": self.other_article_out})
+        self.assertEqual(counters.read(ArticleCount.Scope.FAVORITED, [self.user.id]), 0)
+
+
+class RenderingTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="author", email="a@u.th", password="whatever")
+        self.article = Article.objects.create(author=self.user, title="Title", summary="-", content="*Hi* <b>x</b>")
+        self.client = TestClient(router, headers={"Authorization": f"Token {create_jwt_token(self.user)}"})
+
+    def test_raw_html_and_unsafe_links_are_escaped(self):
+        self.assertEqual(self.article.body_html, "<p><em>Hi</em> &lt;b&gt;x&lt;/b&gt;</p>")
+        html = rendering.render("[a](javascript:alert(1)) [b](https://b.c) ![i](data:x)")
+        self.assertEqual(html, '<p><a>a</a> <a href="https://b.c">b</a> <img alt="i" /></p>')
+
+    def test_only_content_writes_render_again(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.put(f"/articles/{self.article.slug}", json={"article": {"title": "Other"}})
+        self.assertFalse([q for q in queries.captured_queries if "body_html" in q["sql"]])
+        self.client.put("/articles/other", json={"article": {"body": "**New**"}})
+        self.assertEqual(Article.objects.get().body_html, "<p><strong>New</strong></p>")
+
+    def test_retrieve_html_on_request(self):
+        self.assertNotIn("bodyHtml", self.client.get(f"/articles/{self.article.slug}").json()["article"])
+        response = self.client.get(f"/articles/{self.article.slug}", query_params={"html": True})
+        self.assertEqual(response.json()["article"]["bodyHtml"], self.article.body_html)
+        self.assertEqual(response.json()["article"]["body"], self.article.content)
+
+    @parameterized.expand([(0,), (2,)])
+    def test_render_command(self, processes):
+        Article.objects.create(author=self.user, title="Other", summary="-", content="# Heading")
+        Article.objects.update(body_html="")
+        out = io.StringIO()
+        call_command("render_articles", processes=processes, chunk_size=1, stdout=out)
+        self.assertIn("Rendered the body of 2 articles", out.getvalue())
+        self.assertEqual(
+            list(Article.objects.order_by("id").values_list("body_html", flat=True)),
+            ["<p><em>Hi</em> &lt;b&gt;x&lt;/b&gt;</p>", "<h1>Heading</h1>"],
+        )
+
+
+class SlugTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="author", email="a@u.th", password="whatever")
+        self.article = Article.objects.create(author=self.user, title="Same Title", summary="-", content="-")
+
+    def test_conflicting_slugs_get_a_suffix(self):
+        other = Article.objects.create(author=self.user, title="Same title", summary="-", content="-")
+        self.assertRegex(other.slug, r"^same-title-[0-9a-f]{8}$")
+        slug = other.slug
+        other.save()  # Still derived from the title, so it's kept
+        self.assertEqual(Article.objects.get(pk=other.pk).slug, slug)
+
+    def test_saves_without_title_skip_slugs(self):
+        with CaptureQueriesContext(connection) as context:
+            self.article.summary = "Updated"
+            self.article.save(update_fields=["summary"])
+        self.assertFalse([q for q in context.captured_queries if q["sql"].startswith("SELECT")])
+        self.article.title = "New Title"
+        self.article.save(update_fields=["title"])
+        self.assertEqual(Article.objects.get(pk=self.article.pk).slug, "new-title")
+
+
+class ConcurrentSlugTest(TransactionTestCase):
+    def test_concurrent_identical_titles(self):
+        user = User.objects.create_user(username="author", email="a@u.th", password="whatever")
+        barrier = threading.Barrier(4)
+        # Shared in-memory SQLite databases fail concurrent writes instead of waiting: serialized, each still conflicts
+        writing = threading.Lock() if connection.vendor == "sqlite" else contextlib.nullcontext()
+        errors = []
+
+        def create():
+            try:
+                barrier.wait()
+                with writing:
+                    Article.objects.create(author=user, title="Same Title", summary="-", content="-")
+            except Exception as err:
+                errors.append(err)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=create) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        slugs = list(Article.objects.values_list("slug", flat=True))
+        self.assertEqual(len(set(slugs)), 4)
+        self.assertIn("same-title", slugs)
+
+
+class ArticleCountTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", email="test@email.test", password="testpassword")
+        self.other_user = User.objects.create_user(username="otheruser", email="e@g.c", password="whatever")
+        self.client = TestClient(
+            router,
+            headers={"Authorization": f"Token {create_jwt_token(self.user)}", "Content-Type": "application/json"},
+        )
+        self.other_article = Article.objects.create(author=self.other_user, title="Other", summary="-", content="-")
+        self.other_article.tags.add(Tag.objects.create(name="OT"))
+        self.other_user.followers.add(self.user)
+
+    def _counts(self):
+        return {(c.scope, c.ref_id): c.value for c in ArticleCount.objects.exclude(value=0)}
+
+    def _assert_counts_match_rebuild(self):
+        counts = self._counts()
+        counters.rebuild()
+        self.assertEqual(counts, self._counts())
+
+    def test_counters_follow_writes(self):
+        data = {"article": {"title": "New", "description": "-", "body": "-", "tagList": ["OT", "new"]}}
+        self.assertEqual(self.client.post("/articles", json=data).status_code, 201)
+        self._assert_counts_match_rebuild()
+        self.assertEqual(self.client.post("/articles/new/favorite").status_code, 200)
+        self.assertEqual(self.client.post("/articles/other/favorite").status_code, 200)
+        self._assert_counts_match_rebuild()
+        self.assertEqual(self.client.delete("/articles/new/favorite").status_code, 200)
+        self._assert_counts_match_rebuild()
+        data = {"article": {"tagList": ["new", "newer"]}}
+        self.assertEqual(self.client.put("/articles/new", json=data).status_code, 200)
+        self._assert_counts_match_rebuild()
+        self.assertEqual(self.client.delete("/articles/new").status_code, 204)
+        self._assert_counts_match_rebuild()
+        self.other_article.favorites.clear()
+        Tag.objects.get(name="OT").article_set.clear()
+        self._assert_counts_match_rebuild()
+        self.other_user.delete()
+        self._assert_counts_match_rebuild()
+        self.assertEqual(self._counts(), {})
+
+    def test_counters_ignore_removal_of_missing_relations(self):
+        self.other_article.favorites.remove(self.user)
+        self.user.favorites.remove(self.other_article)
+        self._assert_counts_match_rebuild()
+
+    @parameterized.expand(
+        [
+            ["", 2],
+            ["?tag=OT", 1],
+            ["?tag=unknown", 0],
+            ["?author=testuser", 1],
+            ["?favorited=testuser", 1],
+            ["?favorited=otheruser", 0],
+            ["?tag=OT&author=otheruser", 1],
+            ["?tag=OT&author=testuser", 0],
+        ]
+    )
+    def test_articles_count_from_counters(self, query, expected_count):
+        article = Article.objects.create(author=self.user, title="Mine", summary="-", content="-")
+        article.favorites.add(self.user)
+        response = self.client.get(f"/articles{query}", user=self.user)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["articlesCount"], expected_count)
+        self.assertEqual(len(response.data["articles"]), expected_count)
+
+    def test_feed_count_from_counters(self):
+        Article.objects.create(author=self.other_user, title="Other again", summary="-", content="-")
+        response = self.client.get("/articles/feed?limit=1")
+        self.assertEqual(response.data["articlesCount"], 2)
+
+    def test_favorites_count_follows_writes(self):
+        article = Article.objects.create(author=self.user, title="Mine", summary="-", content="-")
+        self.assertEqual(self.client.post("/articles/mine/favorite").data["article"]["favoritesCount"], 1)
+        self.other_user.favorites.add(article, self.other_article)
+        self.assertEqual(Article.objects.get(pk=article.pk).favorites_count, 2)
+        self.assertEqual(self.client.delete("/articles/mine/favorite").data["article"]["favoritesCount"], 1)
+        self.other_user.delete()
+        self.assertEqual(Article.objects.get(pk=article.pk).favorites_count, 0)
+        article.favorites.add(self.user)
+        article.favorites.clear()
+        self.assertEqual(Article.objects.get(pk=article.pk).favorites_count, 0)
+
+    def test_repair_favorites_counts_command(self):
+        self.other_article.favorites.add(self.user)
+        Article.objects.update(favorites_count=42)
+        call_command("repair_favorites_counts", stdout=mock.MagicMock())
+        self.assertEqual(Article.objects.get(pk=self.other_article.pk).favorites_count, 1)
+
+    def test_reconcile_command(self):
+        ArticleCount.objects.update(value=42)
+        call_command("reconcile_article_counts", stdout=mock.MagicMock())
+        tag_id = Tag.objects.get(name="OT").id
+        self.assertEqual(self._counts(), {("all", 0): 1, ("author", self.other_user.id): 1, ("tag", tag_id): 1})
+
+
+class TimelineTest(TestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user(username="reader", email="r@e.ad", password="whatever")
+        self.other_reader = User.objects.create_user(username="other", email="o@t.her", password="whatever")
+        self.author = User.objects.create_user(username="author", email="a@u.th", password="whatever")
+        self.client = TestClient(
+            router,
+            headers={"Authorization": f"Token {create_jwt_token(self.reader)}", "Content-Type": "application/json"},
+        )
+        self.old_article = Article.objects.create(author=self.author, title="Old", summary="-", content="-")
+
+    def _feed_slugs(self):
+        response = self.client.get("/articles/feed")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["articlesCount"], len(response.data["articles"]))
+        return [a["slug"] for a in response.data["articles"]]
+
+    def _timeline(self, user):
+        return set(TimelineEntry.objects.filter(user=user).values_list("article__slug", flat=True))
+
+    def test_follow_create_and_unfollow(self):
+        self.author.followers.add(self.reader)
+        self.assertEqual(self._timeline(self.reader), {"old"})
+        Article.objects.create(author=self.author, title="New", summary="-", content="-")
+        self.assertEqual(self._timeline(self.reader), {"old", "new"})
+        self.assertEqual(self._feed_slugs(), ["new", "old"])
+        self.reader.user_set.remove(self.author)
+        self.assertEqual(self._timeline(self.reader), set())
+        self.assertEqual(self._feed_slugs(), [])
+
+    def test_delete_article_and_clear_followers(self):
+        self.author.followers.add(self.reader, self.other_reader)
+        self.old_article.delete()
+        self.assertEqual(TimelineEntry.objects.count(), 0)
+        Article.objects.create(author=self.author, title="New", summary="-", content="-")
+        self.assertEqual(TimelineEntry.objects.count(), 2)
+        self.author.followers.clear()
+        self.assertEqual(TimelineEntry.objects.count(), 0)
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+    def test_authors_with_too_many_followers_are_pulled(self):
+        self.author.followers.add(self.reader, self.other_reader)
+        Article.objects.create(author=self.author, title="New", summary="-", content="-")
+        self.assertEqual(TimelineEntry.objects.count(), 0)
+        self.assertEqual(self._feed_slugs(), ["new", "old"])
+        self.author.followers.remove(self.other_reader)  # Not pulled anymore, so pushed again
+        self.assertEqual(self._timeline(self.reader), {"old", "new"})
+        self.assertEqual(self._feed_slugs(), ["new", "old"])
+
+    def test_feed_pages_are_read_from_the_entries(self):
+        self.author.followers.add(self.reader)
+        self._feed_slugs()  # So that the auth is cached
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self._feed_slugs(), ["old"])
+        self.assertFalse(any("feed_pulled" in query["sql"] for query in context.captured_queries))
+        page = TimelineEntry.objects.filter(user=self.reader).order_by("-created", "-article_id")[:21]
+        if connection.vendor == "sqlite":
+            plan = page.explain()
+            self.assertIn("timeline_user_created_idx", plan)
+            self.assertNotIn("TEMP B-TREE", plan)  # Read in the order of the index, not sorted
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+    def test_pulled_and_pushed_articles_are_merged(self):
+        pushed_author = User.objects.create_user(username="pushed", email="p@u.sh", password="whatever")
+        self.author.followers.add(self.reader, self.other_reader)
+        pushed_author.followers.add(self.reader)
+        self.reader.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual((self.author.feed_pulled, self.reader.pulled_follows), (True, 1))
+        for i in range(4):
+            Article.objects.create(author=(self.author, pushed_author)[i % 2], title=f"A{i}", summary="-", content="-")
+        expected = ["a3", "a2", "a1", "a0", "old"]
+        self.assertEqual(self._feed_slugs(), expected)
+        offsets = [self.client.get("/articles/feed", query_params={"limit": 2, "offset": o}) for o in (0, 2, 4)]
+        self.assertEqual([a["slug"] for r in offsets for a in r.data["articles"]], expected)
+        slugs, cursor = [], ""
+        while cursor is not None:
+            data = self.client.get("/articles/feed", query_params={"limit": 2, "cursor": cursor}).data
+            slugs, cursor = slugs + [a["slug"] for a in data["articles"]], data["nextCursor"]
+        self.assertEqual(slugs, expected)
+        self.author.followers.remove(self.other_reader)
+        self.reader.refresh_from_db()
+        self.assertEqual(self.reader.pulled_follows, 0)
+        self.assertEqual(self._feed_slugs(), expected)
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+    def test_pulled_follows_are_not_read_from_the_cached_auth(self):
+        self.author.followers.add(self.other_reader, User.objects.create_user(username="x", email="x@x.x"))
+        self.assertEqual(self._feed_slugs(), [])  # Caches the auth of the reader, as not following pulled authors
+        self.author.followers.add(self.reader)
+        self.assertEqual(self._feed_slugs(), ["old"])
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+    def test_rebuild_command(self):
+        self.author.followers.add(self.reader)
+        TimelineEntry.objects.all().delete()
+        call_command("rebuild_timelines", stdout=mock.MagicMock())
+        self.assertEqual(self._timeline(self.reader), {"old"})
+
+
+class LoadersTest(TestCase):
+    def setUp(self):
+        self.viewer = User.objects.create_user(username="viewer", email="v@i.ew", password="whatever")
+        for i in range(3):
+            author = User.objects.create_user(username=f"author{i}", email=f"a{i}@u.th", password="whatever")
+            article = Article.objects.create(author=author, title=f"Title {i}", summary="-", content="-")
+            article.tags.add(*(Tag.objects.get_or_create(name=f"tag{j}")[0] for j in range(i + 1)))
+            if i % 2:
+                author.followers.add(self.viewer)
+
+    def test_page_resolves_with_one_query_per_relation(self):
+        request = RequestFactory().get("/articles")
+        request.user = self.viewer
+        articles = list(Article.objects.select_related("author").order_by("id"))
+        articles[2].favorites.add(self.viewer)
+        with self.assertNumQueries(2):  # The viewer's follows and favorites in one pass, then all the tags
+            loaders.prime(request, articles)
+            out = [ArticleListOutSchema.from_orm(a, context={"request": request}) for a in articles]
+        self.assertEqual([a.tagList for a in out], [["tag0"], ["tag0", "tag1"], ["tag0", "tag1", "tag2"]])
+        self.assertEqual([a.author.following for a in out], [False, True, False])
+        self.assertEqual([a.favorited for a in out], [False, False, True])
+
+    def test_list_query_count_does_not_depend_on_page_size(self):
+        client = TestClient(router)
+        with self.assertNumQueries(4) as queries:  # Page, count, viewer, tags
+            self.assertEqual(len(client.get("/articles?limit=1", user=self.viewer).data["articles"]), 1)
+        self.assertNotIn("content", queries.captured_queries[0]["sql"])  # Not output by list views
+        with self.assertNumQueries(4):
+            self.assertEqual(len(client.get("/articles?limit=3", user=self.viewer).data["articles"]), 3)
+
+    @parameterized.expand([(True,), (False,)])
+    def test_trusted_output_is_the_validated_one(self, authenticated):
+        User.objects.filter(username="author1").update(bio="Bio", image="https://i.mg/1.png")
+        Article.objects.get(title="Title 2").favorites.add(self.viewer)
+        outputs = []
+        for build in (
+            lambda a, request: ArticleListOutSchema.from_orm(a, context={"request": request}),
+            ArticleListOutSchema.from_trusted,
+        ):
+            request = RequestFactory().get("/articles")
+            request.user = self.viewer if authenticated else AnonymousUser()
+            articles = list(project(Article.objects.order_by("id"), ArticleListOutSchema))
+            loaders.prime(request, articles)
+            outputs.append([build(a, request).model_dump() for a in articles])
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(*(ORJSONRenderer().render(None, output, response_status=200) for output in outputs))
+        self.assertEqual([a["author"]["following"] for a in outputs[1]], [False, authenticated, False])
+        self.assertEqual([a["favorited"] for a in outputs[1]], [False, False, authenticated])
+
+
+class ImportTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="author", email="a@u.th", password="whatever")
+        self.follower = User.objects.create_user(username="follower", email="f@o.ll", password="whatever")
+        self.user.followers.add(self.follower)
+        Article.objects.create(author=self.user, title="Taken", summary="-", content="-")
+        self.records = [
+            {"title": "Taken", "description": "d", "body": "Searchable", "tagList": ["a", "b", "a"]},
+            {"title": "New", "description": "d", "body": "b", "tagList": ["b"]},
+            {"title": "New", "description": "d", "body": "b"},
+        ]
+        self.ndjson = b"\n".join([json.dumps(r).encode() for r in self.records[:2]] + [b"{oops", b""])
+
+    def _assert_imported(self):
+        self.assertEqual(Article.objects.count(), 3)
+        slugs = set(Article.objects.values_list("slug", flat=True))
+        self.assertEqual(len(slugs), 3)
+        self.assertIn("new", slugs)
+        self.assertEqual(
+            {a.slug.startswith("taken") and tuple(sorted(t.name for t in a.tags.all())) for a in Article.objects.all()},
+            {(), ("a", "b"), False},
+        )
+        self.assertEqual(counters.read(ArticleCount.Scope.ALL), 3)
+        self.assertEqual(counters.read(ArticleCount.Scope.TAG, Tag.objects.filter(name="b").values("id")), 2)
+        self.assertEqual(TimelineEntry.objects.filter(user=self.follower).count(), 3)
+        self.assertEqual(search.search(Article.objects.all(), "searchable").count(), 1)
+        self.assertTrue(all(a.body_html == rendering.render(a.content) for a in Article.objects.all()))
+
+    def test_read_records(self):
+        self.assertEqual(
+            list(imports.read_records(io.BytesIO(b"  " + json.dumps(self.records).encode()))), self.records
+        )
+        self.assertEqual(list(imports.read_records(io.BytesIO(self.ndjson)))[:2], self.records[:2])
+        self.assertIsInstance(list(imports.read_records(io.BytesIO(self.ndjson)))[2], imports.InvalidRecord)
+        self.assertEqual(list(imports.read_records(io.BytesIO(b""))), [])
+
+    def test_import_articles(self):
+        report = imports.import_articles([*self.records[:2], {"title": ""}, "x"], author=self.user, chunk_size=1)
+        self.assertEqual(report.imported, 2)
+        self.assertEqual([error["record"] for error in report.errors], [3, 4])
+        self._assert_imported()
+
+    def test_invalid_authors_are_reported(self):
+        records = [{**self.records[1], "author": ["author"]}, {**self.records[1], "author": {}}, {"author": "author"}]
+        report = imports.import_articles([*records, {**self.records[1], "author": "author"}])
+        self.assertEqual((report.imported, [error["record"] for error in report.errors]), (1, [1, 2, 3]))
+
+    def test_slugs_taken_meanwhile(self):
+        unique_slugs = imports._unique_slugs
+        stale = [lambda titles: [slugify(title) for title in titles]]  # As read before the "Taken" article was created
+
+        def slugs(titles):
+            return (stale.pop() if stale else unique_slugs)(titles)
+
+        with mock.patch.object(imports, "_unique_slugs", side_effect=slugs):
+            report = imports.import_articles(self.records[:2], author=self.user)
+        self.assertEqual((report.imported, report.errors), (2, []))
+        self._assert_imported()
+        with mock.patch.object(imports, "_unique_slugs", side_effect=lambda titles: ["new"] * len(titles)):
+            report = imports.import_articles(self.records[1:], author=self.user, chunk_size=1)
+        self.assertEqual(report.errors, [{"record": number, "error": "slug conflict"} for number in (1, 2)])
+        self.assertEqual(Article.objects.count(), 3)
+
+    def test_import_endpoint(self):
+        response = Client().post(
+            "/api/import/articles",
+            data=self.ndjson,
+            content_type="application/x-ndjson",
+            headers={"Authorization": f"Token {create_jwt_token(self.user)}"},
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["imported"], 2)
+        self.assertEqual(response.json()["errors"], [{"record": 3, "error": mock.ANY}])
+        self._assert_imported()
+
+    def test_article_titled_import(self):
+        client = Client(headers={"Authorization": f"Token {create_jwt_token(self.user)}"})
+        article = Article.objects.create(author=self.user, title="Import", summary="-", content="-")
+        self.assertEqual(article.slug, "import")
+        self.assertEqual(client.get("/api/articles/import").json()["article"]["title"], "Import")
+        response = client.put("/api/articles/import", {"article": {"body": "Edited"}}, content_type="application/json")
+        self.assertEqual(response.json()["article"]["body"], "Edited")
+        self.assertEqual(client.delete("/api/articles/import").status_code, 204)
+
+    def test_import_command(self):
+        records = [{**record, "author": "author"} for record in self.records[:2]] + [{**self.records[2], "author": "x"}]
+        with tempfile.NamedTemporaryFile(suffix=".json") as file:
+            file.write(json.dumps(records).encode())
+            file.flush()
+            out, err = io.StringIO(), io.StringIO()
+            call_command("import_articles", file.name, stdout=out, stderr=err)
+        self.assertIn("Imported 2 articles", out.getvalue())
+        self.assertIn("Skipped record 3: unknown author: x", err.getvalue())
+        self._assert_imported()
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="author", email="a@u.th", password="whatever")
+        self.client = TestClient(router)
+        for title, summary, content in (
+            ("Gardening basics", "Tomatoes and roses", "Water them."),
+            ("Cooking", "Weekly recipes", "Tomatoes, again."),
+            ("Travel", "Far away", "Nothing about plants."),
+        ):
+            Article.objects.create(author=self.user, title=title, summary=summary, content=content)
+
+    def _search(self, q, **params):
+        response = self.client.get("/articles", query_params={"q": q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [a["title"] for a in response.data["articles"]], response.data["articlesCount"]
+
+    def test_search_is_ranked_and_paginated(self):
+        self.assertEqual(self._search("tomatoes"), (["Gardening basics", "Cooking"], 2))
+        self.assertEqual(self._search("tomato recipes"), (["Cooking"], 1))
+        self.assertEqual(self._search("tomatoes", limit=1, offset=1), (["Cooking"], 2))
+        self.assertEqual(self._search('"roses OR* (water'), ([], 0))  # Not parsed as query syntax
+
+    def test_search_follows_writes(self):
+        article = Article.objects.get(title="Travel")
+        article.content = "Tomatoes everywhere."
+        article.save(update_fields=["content"])
+        self.assertEqual(self._search("tomatoes")[1], 3)
+        article.delete()
+        self.assertEqual(self._search("tomatoes")[1], 2)
+
+    def test_search_with_cursor_is_invalid(self):
+        response = self.client.get("/articles", query_params={"q": "tomatoes", "cursor": ""})
+        self.assertEqual(response.status_code, 422)
+
+
+class AsyncReadTest(TestCase):
+    """The async reads, through the ASGI handler and the auth middleware instead of a router test client"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="reader", email="r@e.c", password="password")
+        self.author = User.objects.create_user(username="author", email="a@e.c", password="password")
+        self.author.followers.add(self.user)
+        self.article = Article.objects.create(author=self.author, title="Async", summary="s", content="c")
+        self.article.tags.add(Tag.objects.create(name="io"))
+        self.headers = {"Authorization": f"Token {create_jwt_token(self.user)}"}
+
+    async def test_reads(self):
+        client = AsyncClient()
+        response = await client.get("/api/articles")
+        self.assertEqual(response.json()["articlesCount"], 1)
+        self.assertEqual(response.json()["articles"][0]["tagList"], ["io"])
+        response = await client.get("/api/articles/feed", headers=self.headers)
+        self.assertEqual(response.json()["articles"][0]["author"]["following"], True)
+        response = await client.get("/api/articles/async", headers=self.headers)
+        self.assertEqual(response.json()["article"]["body"], "c")
+        response = await client.get("/api/articles/async/comments")
+        self.assertEqual(response.json(), {"comments": []})
+        response = await client.get("/api/profiles/author", headers=self.headers)
+        self.assertEqual(response.json()["profile"]["following"], True)
+        self.assertEqual((await client.get("/api/tags")).json(), {"tags": ["io"]})
+        self.assertEqual((await client.get("/api/articles/missing")).status_code, 404)
+
+    @override_settings(EXPORT_CHUNK_SIZE=1)
+    async def test_export_streams_chunks(self):
+        await Article.objects.acreate(author=self.author, title="Export", summary="s", content="c")
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")  # Django warns when it has to read a sync iterator whole
+            response = await AsyncClient().get("/api/export/articles", headers=self.headers)
+            chunks = [chunk async for chunk in response]  # As the ASGI handler sends it
+        self.assertEqual([loads(chunk)["title"] for chunk in chunks], ["Async", "Export"])
+        response = await AsyncClient().get("/api/articles/export", headers=self.headers)
+        self.assertEqual(response.json()["article"]["title"], "Export")
+
+    async def test_invalid_token_passes_as_anonymous(self):
+        response = await AsyncClient().get("/api/articles/async", headers={"Authorization": "Token x"})
+        self.assertEqual(response.json()["article"]["favorited"], False)
+
+
+class ResponseCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="author", email="a@u.th", password="whatever")
+        self.article = Article.objects.create(author=self.user, title="Title", summary="-", content="-")
+        self.anonymous_client = TestClient(router)
+        self.client = TestClient(router, headers={"Authorization": f"Token {create_jwt_token(self.user)}"})
+
+    def test_anonymous_responses_are_cached(self):
+        response = self.anonymous_client.get("/articles", query_params={"limit": 5, "offset": 0})
+        with self.assertNumQueries(0):
+            cached = self.anonymous_client.get("/articles", query_params={"offset": 0, "limit": 5})
+        self.assertEqual(cached.status_code, 200)
+        self.assertEqual(cached.content, response.content)
+        self.anonymous_client.get("/tags")
+        with self.assertNumQueries(0):
+            self.anonymous_client.get("/tags")
+        self.assertEqual(self.anonymous_client.get("/articles?limit=1").data["articles"], response.data["articles"])
+
+    def test_authenticated_responses_are_not_cached(self):
+        self.client.get("/articles")
+        with self.assertNumQueries(4):  # Page, count, viewer, tags
+            self.anonymous_client.get("/articles", user=self.user)
+
+    @parameterized.expand(
+        (
+            ("create",),
+            ("update",),
+            ("destroy",),
+            ("profile",),
+        )
+    )
+    def test_writes_invalidate(self, write):
+        before = self.anonymous_client.get("/articles").data
+        if write == "create":
+            self.client.post("/articles", json={"article": {"title": "New", "description": "-", "body": "-"}})
+        elif write == "update":
+            self.client.put(f"/articles/{self.article.slug}", json={"article": {"description": "Updated"}})
+        elif write == "destroy":
+            self.client.delete(f"/articles/{self.article.slug}")
+        else:
+            self.user.bio = "Updated"
+            self.user.save()
+        self.assertNotEqual(self.anonymous_client.get("/articles").data, before)
+
+    @parameterized.expand((("api",), ("user",)))
+    def test_favorites_invalidate_the_lists_of_the_article(self, path):
+        User.objects.create_user(username="other", email="o@u.th", password="whatever")
+        self.article.tags.add(Tag.objects.create(name="tag"))
+        pages = [{}, {"author": "author"}, {"tag": "tag"}, {"favorited": "author"}, {"author": "other"}]
+        before = [self.anonymous_client.get("/articles", query_params=params).data for params in pages]
+        if path == "api":
+            self.client.post(f"/articles/{self.article.slug}/favorite")
+        else:
+            self.user.favorites.add(self.article)
+        after = [self.anonymous_client.get("/articles", query_params=params).data for params in pages]
+        self.assertEqual([[a["favoritesCount"] for a in page["articles"]] for page in after], [[1]] * 4 + [[]])
+        self.assertEqual(after[4], before[4])
+        self.client.delete(f"/articles/{self.article.slug}/favorite")
+        self.assertEqual(self.anonymous_client.get("/articles", query_params=pages[3]).data["articles"], [])
+        self.assertEqual(self.anonymous_client.get("/articles").data["articles"][0]["favoritesCount"], 0)
+
+    def test_new_articles_only_invalidate_their_lists(self):
+        other = User.objects.create_user(username="other", email="o@u.th", password="whatever")
+        self.article.tags.add(Tag.objects.create(name="tag"))
+        pages = [{}, {"author": "author"}, {"author": "other"}, {"tag": "tag"}]
+        before = [self.anonymous_client.get("/articles", query_params=params).data for params in pages]
+        Article.objects.create(author=other, title="New", summary="-", content="-")
+        after = [self.anonymous_client.get("/articles", query_params=params).data for params in pages]
+        self.assertEqual([a["articlesCount"] for a in after], [2, 1, 1, 1])
+        self.assertEqual((after[1], after[3]), (before[1], before[3]))
+        Article.objects.get(title="New").tags.add(Tag.objects.get(name="tag"))
+        self.assertEqual(self.anonymous_client.get("/articles", query_params={"tag": "tag"}).data["articlesCount"], 2)
+        self.assertEqual(self.anonymous_client.get("/articles", query_params={"author": "author"}).data, before[1])
+
+    def test_tag_writes_invalidate(self):
+        self.assertEqual(self.anonymous_client.get("/tags").data, {"tags": []})
+        self.client.put(f"/articles/{self.article.slug}", json={"article": {"tagList": ["new"]}})
+        self.assertEqual(self.anonymous_client.get("/tags").data, {"tags": ["new"]})
+        self.assertEqual(self.anonymous_client.get("/articles").data["articles"][0]["tagList"], ["new"])
+
+
+class RendererTest(TestCase):
+    def test_same_output_as_stdlib(self):
+        moment = datetime(2024, 5, 6, 7, 8, 9, 123456, tzinfo=UTC)
+        data = {
+            "datetimes": [moment, moment.replace(microsecond=0), moment.astimezone(timezone(timedelta(hours=2)))],
+            "naive": moment.replace(tzinfo=None),
+            "date": date(2024, 5, 6),
+            "uuid": uuid.UUID(int=42),
+            "decimal": Decimal("1.10"),
+            "schema": ArticleListOutSchema.model_construct(title="Title"),
+            "unicode": "héllo",
+            1: None,
+        }
+        fast = ORJSONRenderer().render(None, data, response_status=200)
+        self.assertEqual(loads(fast), loads(JSONRenderer().render(None, data, response_status=200)))
+        self.assertEqual(
+            loads(fast)["datetimes"],
+            ["2024-05-06T07:08:09.123Z", "2024-05-06T07:08:09Z", "2024-05-06T09:08:09.123+02:00"],
+        )
+
+    def test_api_renders_and_parses_with_orjson(self):
+        self.assertIsInstance(api.renderer, ORJSONRenderer)
+        self.assertEqual(api.renderer.render(None, {"a": [1]}, response_status=200), b'{"a":[1]}')
+        request = RequestFactory().post("/", data=b'{"a": ["\\u00e9"]}', content_type="application/json")
+        self.assertEqual(api.parser.parse_body(request), {"a": ["é"]})
+        with self.assertRaises(ValueError):
+            api.parser.parse_body(RequestFactory().post("/", data=b"{", content_type="application/json"))
+
 
 class TagViewSet(TestCase):
     def setUp(self):
@@ -498,3 +1281,15 @@ class TagViewSet(TestCase):
         data = loads(response.content)
         self.assertEqual(data, {"tags": mock.ANY})
         self.assertEqual(set(data["tags"]), {"red", "green", "blue"})
+
+    def test_list_top_tags(self):
+        other_article = Article.objects.create(author=self.user, title="Other", summary="-", content="-")
+        other_article.tags.add(Tag.objects.get(name="red"), Tag.objects.get(name="green"))
+        Tag.objects.create(name="unused")
+        response = self.client.get("/tags?top=2")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(loads(response.content), {"tags": ["red", "green"]})
+        self.article.delete()
+        response = self.client.get("/tags?top=5&counts=true")
+        self.assertEqual(loads(response.content), {"tags": ["red", "green"], "articlesCounts": {"red": 1, "green": 1}})
+        self.assertEqual(loads(self.client.get("/tags?top=0").content), {"tags": []})
@@ -0,0 +1,157 @@
+"""
+Materialized personal feeds: each article is pushed as a `TimelineEntry` to every follower of its author when written,
+with its creation date, so that a page of a feed is a range scan of the `(user, -created, -article)` index of the
+entries of its reader, followed by a lookup of these articles by id.
+Authors having more than `settings.FEED_FANOUT_MAX_FOLLOWERS` followers are flagged as `feed_pulled` and not fanned
+out, their articles are pulled when reading the feed instead, and merged with the entries. Users count the pulled
+authors they follow in `pulled_follows`, so that only their feeds look for them. The signal handlers in
+`articles.signals` keep the timelines, flags and counts in sync.
+"""
+
+import heapq
+from collections import defaultdict
+from collections.abc import Iterable
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, QuerySet
+from django.db.models.functions import Greatest
+
+from articles.models import Article, TimelineEntry
+from helpers.pagination import encode_keyset, keyset_filter
+
+User = get_user_model()
+Follow = User.followers.through  # `from_user` is followed by `to_user`
+
+Pairs = list[tuple[int, int]]  # (author_id, follower_id)
+Row = tuple[datetime, int]  # (created, article_id)
+
+
+def _past_max(author_ids: Iterable[int]) -> set[int]:
+    """Authors among `author_ids` with too many followers to be fanned out, checked without counting them all"""
+    followers_past_max = Follow.objects.filter(from_user=OuterRef("pk"))[settings.FEED_FANOUT_MAX_FOLLOWERS :]
+    authors = User.objects.filter(id__in=author_ids).filter(Exists(followers_past_max))
+    return set(authors.values_list("id", flat=True))
+
+
+def pulled_author_ids(author_ids: Iterable[int] | QuerySet) -> set[int]:
+    """Authors among `author_ids` whose articles are pulled when reading the feeds"""
+    return set(User.objects.filter(id__in=author_ids, feed_pulled=True).values_list("id", flat=True))
+
+
+def _count_pulled_follows(follower_ids: Iterable[int] | QuerySet, delta: int) -> None:
+    User.objects.filter(id__in=follower_ids).update(pulled_follows=Greatest(F("pulled_follows") + delta, 0))
+
+
+def _set_pulled(author_ids: set[int], pulled: bool) -> None:
+    if not author_ids:
+        return
+    User.objects.filter(id__in=author_ids).update(feed_pulled=pulled)
+    if pulled:
+        TimelineEntry.objects.filter(article__author_id__in=author_ids).delete()
+    for author_id in author_ids:  # Per author, as a user following several of them counts each
+        _count_pulled_follows(Follow.objects.filter(from_user_id=author_id).values("to_user_id"), 1 if pulled else -1)
+
+
+def _group(pairs: Pairs) -> dict[int, list[int]]:
+    followers_by_author: dict[int, list[int]] = defaultdict(list)
+    for author_id, follower_id in pairs:
+        followers_by_author[author_id].append(follower_id)
+    return followers_by_author
+
+
+def _push(author_id: int, follower_ids: Iterable[int]) -> None:
+    """Push every article of `author_id` to the timelines of `follower_ids`"""
+    articles = list(Article.objects.filter(author_id=author_id).values_list("id", "created"))
+    entries = (TimelineEntry(user_id=f, article_id=a, created=c) for f in follower_ids for a, c in articles)
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True, batch_size=1000)
+
+
+def fan_out(articles: Iterable[Article]) -> None:
+    """Push new articles to the timelines of the followers of their authors"""
+    articles_by_author: dict[int, list[Article]] = defaultdict(list)
+    for article in articles:
+        articles_by_author[article.author_id].append(article)
+    pushed = set(articles_by_author) - pulled_author_ids(articles_by_author)
+    follows = Follow.objects.filter(from_user_id__in=pushed).values_list("from_user_id", "to_user_id")
+    entries = (
+        TimelineEntry(user_id=follower_id, article_id=article.id, created=article.created)
+        for author_id, follower_id in follows.iterator()
+        for article in articles_by_author[author_id]
+    )
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True, batch_size=1000)
+
+
+def follow(pairs: Pairs) -> None:
+    """An author getting past the maximum of followers is pulled from now on, its entries being dropped"""
+    followers_by_author = _group(pairs)
+    pulled = pulled_author_ids(followers_by_author)
+    newly_pulled = _past_max(set(followers_by_author) - pulled)
+    _set_pulled(newly_pulled, True)  # Which counts all their followers, the new ones included
+    for author_id in pulled:
+        _count_pulled_follows(followers_by_author[author_id], 1)
+    for author_id in set(followers_by_author) - pulled - newly_pulled:
+        _push(author_id, followers_by_author[author_id])
+
+
+def unfollow(pairs: Pairs, pulled_before: set[int]) -> None:
+    """
+    Retract the articles of the unfollowed authors. An author that is no longer pulled after losing followers gets
+    fanned out again to all its remaining followers, as its articles were pulled until now.
+    """
+    followers_by_author = _group(pairs)
+    for author_id, follower_ids in followers_by_author.items():
+        TimelineEntry.objects.filter(user_id__in=follower_ids, article__author_id=author_id).delete()
+        if author_id in pulled_before:
+            _count_pulled_follows(follower_ids, -1)
+    no_longer_pulled = pulled_before - _past_max(pulled_before)
+    _set_pulled(no_longer_pulled, False)
+    for author_id in no_longer_pulled:
+        _push(author_id, Follow.objects.filter(from_user_id=author_id).values_list("to_user_id", flat=True))
+
+
+@transaction.atomic
+def rebuild() -> None:
+    TimelineEntry.objects.all().delete()
+    User.objects.update(feed_pulled=False, pulled_follows=0)
+    authors = set(Follow.objects.values_list("from_user_id", flat=True).distinct())
+    pulled = _past_max(authors)
+    _set_pulled(pulled, True)
+    for author_id in authors - pulled:
+        _push(author_id, Follow.objects.filter(from_user_id=author_id).values_list("to_user_id", flat=True))
+
+
+def _sources(user: User, pulled: list[int], cursor: str, end: int) -> list[QuerySet]:
+    """The entries of `user`, and the articles of the `pulled` authors, each up to `end` through its index"""
+    entries = keyset_filter(TimelineEntry.objects.filter(user=user), cursor, id_field="article_id")
+    sources = [entries.values_list("created", "article_id")[:end]]
+    if pulled:
+        articles = keyset_filter(Article.objects.filter(author_id__in=pulled), cursor)
+        sources.append(articles.values_list("created", "id")[:end])
+    return sources
+
+
+def _page(sources: list[list[Row]], offset: int, limit: int) -> tuple[list[int], str | None]:
+    rows = list(dict.fromkeys(heapq.merge(*sources, reverse=True)))  # Deduplicated, in case of entries left over
+    page = rows[offset : offset + limit + 1]  # One more row tells whether there is a next page
+    next_cursor = encode_keyset(*page[limit - 1]) if len(page) > limit > 0 else None
+    return [article_id for _, article_id in page[:limit]], next_cursor
+
+
+async def afeed_page(user: User, limit: int, offset: int, cursor: str | None) -> tuple[list[int], str | None]:
+    """
+    Ids of the articles of a page of the feed of `user`, most recent first, with the next cursor when paginating with
+    a `cursor`, as `helpers.pagination.keyset_page` would. Pulled authors are only looked for if `user` follows some,
+    as counted in the database: the `user` of a request may come from the auth cache, which other workers don't update.
+    """
+    offset = 0 if cursor is not None else max(offset, 0)
+    limit = max(limit, 0)
+    followed = User.objects.filter(followers=user, feed_pulled=True).values_list("id", flat=True)
+    pulled_follows = await User.objects.filter(pk=user.pk).values_list("pulled_follows", flat=True).aget()
+    pulled = [author_id async for author_id in followed] if pulled_follows else []
+    sources = _sources(user, pulled, cursor or "", offset + limit + 1)  # Decoded first, an invalid cursor is an error
+    if not limit:
+        return [], None
+    return _page([[row async for row in source] for source in sources], offset, limit)
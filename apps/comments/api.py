@@ -1,43 +1,81 @@
-from accounts.models import User
+from typing import Any
+
+from accounts.viewer import aget_viewer
 from articles.models import Article
-from django.db.models import Exists, OuterRef, Value
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from ninja import Router
+from ninja.decorators import decorate_view
 from ninja.errors import AuthorizationError
 
 from comments.models import Comment
 from comments.schemas import (
     CommentContainerSchemaIn,
+    CommentExportSchema,
     CommentOutContainerSchema,
     CommentOutSchema,
     CommentsListOutSchema,
+    CommentsPageOutSchema,
 )
-from helpers.exceptions import get_or_404
-from helpers.jwt_utils import AuthedRequest, TokenAuth
+from helpers.cache import cache_anonymous
+from helpers.conditional import make_etag, not_modified
+from helpers.exceptions import aget_or_404, get_or_404
+from helpers.export import ndjson_response
+from helpers.jwt_utils import AsyncTokenAuth, AuthedRequest, TokenAuth
+from helpers.pagination import akeyset_page
+from helpers.projection import project
 
 router = Router()
 
 
-def _annotate_author_following(queryset, user):
-    """Annotate comments with whether the current user follows each author."""
-    if user.is_authenticated:
-        return queryset.annotate(author_following=Exists(User.objects.filter(pk=OuterRef("author_id"), followers=user)))
-    return queryset.annotate(author_following=Value(False))
-
-
-@router.get("/articles/{slug}/comments", auth=TokenAuth(pass_even=True), response={200: CommentsListOutSchema})
-def list_comments(request, slug: str) -> CommentsListOutSchema:
-    article = get_or_404(Article, "article", slug=slug)
-    comments = Comment.objects.filter(article=article).select_related("author").order_by("-created")
-    comments = _annotate_author_following(comments, request.user)
+async def _comments_page(
+    request, slug: str, response: HttpResponse, limit: int, cursor: str
+) -> CommentsPageOutSchema | HttpResponse:
+    """Keyset pagination on `(created, id)` through `comment_article_created_idx`, so that a page only reads its rows"""
+    article = await aget_or_404(Article.objects.only("id", "comments_count"), "article", slug=slug)
+    queryset = Comment.objects.filter(article=article)
+    comments, next_cursor = await akeyset_page(project(queryset, CommentOutSchema), cursor, limit)
+    comments_count = article.comments_count
+    viewer = await aget_viewer(request)
+    await viewer.aload_page(author_ids={c.author_id for c in comments})
+    authors = [(c.author.username, c.author.bio, c.author.image, viewer.follows(c.author_id)) for c in comments]
+    etag = make_etag([(c.id, c.updated) for c in comments], authors, comments_count, next_cursor)
+    if unchanged := not_modified(request, response, etag):
+        return unchanged
+    return CommentsPageOutSchema.model_construct(
+        comments=[CommentOutSchema.from_trusted(c, request) for c in comments],
+        commentsCount=comments_count,
+        nextCursor=next_cursor,
+    )
 
-    # Attach annotation to author objects for ProfileSchema to read
-    comment_list = []
-    for c in comments:
-        c.author.following = c.author_following
-        comment_list.append(CommentOutSchema.from_orm(c))
 
-    return CommentsListOutSchema.model_construct(comments=comment_list)
+@router.get(
+    "/articles/{slug}/comments",
+    auth=AsyncTokenAuth(pass_even=True),
+    response={200: CommentsListOutSchema | CommentsPageOutSchema},
+)
+@decorate_view(cache_anonymous("comments", lambda request, slug: f"comments:{slug}"))
+async def list_comments(
+    request, slug: str, response: HttpResponse, limit: int | None = None, cursor: str | None = None
+) -> CommentsListOutSchema | CommentsPageOutSchema | HttpResponse:
+    """
+    All the comments as required by the RealWorld API spec, or when a `limit` or a `cursor` is given, a page of them
+    with their `commentsCount`, and the `nextCursor` to pass to get the next page. An empty `cursor` requests the first.
+    Conditional GET, validated by a query skipping the comment bodies. There is no `Last-Modified`,
+    as deleting a comment doesn't move any timestamp.
+    """
+    if limit is not None or cursor is not None:
+        return await _comments_page(request, slug, response, 20 if limit is None else limit, cursor or "")
+    article = await aget_or_404(Article.objects.only("id"), "article", slug=slug)
+    queryset = Comment.objects.filter(article=article).order_by("-created")
+    fields = ("id", "updated", "author_id", "author__username", "author__bio", "author__image")
+    versions = [row async for row in queryset.values_list(*fields)]
+    viewer = await aget_viewer(request)
+    await viewer.aload_page(author_ids={author_id for _, _, author_id, *_ in versions})
+    etag = make_etag(versions, sorted(viewer.followed_ids))
+    if unchanged := not_modified(request, response, etag):
+        return unchanged
+    comments = [comment async for comment in project(queryset, CommentOutSchema)]
+    return CommentsListOutSchema.model_construct(comments=[CommentOutSchema.from_trusted(c, request) for c in comments])
 
 
 @router.post("/articles/{slug}/comments", auth=TokenAuth(), response={201: CommentOutContainerSchema})
@@ -64,3 +102,9 @@ def delete_comment(request: AuthedRequest, slug: str, comment_id: int) -> HttpRe
         raise AuthorizationError
     comment.delete()
     return HttpResponse(status=204)
+
+
+@router.get("/export/comments", auth=TokenAuth(), response={200: Any})
+def export_comments(request: AuthedRequest, after: int | None = None) -> StreamingHttpResponse:
+    """All the comments as NDJSON streamed by ascending id, resumed from the last id received, passed as `after`"""
+    return ndjson_response(request, project(Comment.objects.all(), CommentExportSchema), CommentExportSchema, after)
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("articles", "0011_article_body_html"),
+        ("comments", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(fields=["article", "-created", "-id"], name="comment_article_created_idx"),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:45
+
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_existing_comments(apps, schema_editor):
+    Article = apps.get_model("articles", "Article")
+    Comment = apps.get_model("comments", "Comment")
+    comments = Comment.objects.filter(article_id=OuterRef("pk")).values("article_id")
+    Article.objects.update(comments_count=Coalesce(Subquery(comments.annotate(n=Count("id")).values("n")), 0))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("articles", "0012_article_comments_count"),
+        ("comments", "0002_comment_article_created_idx"),
+    ]
+
+    operations = [
+        migrations.RunPython(count_existing_comments, migrations.RunPython.noop),
+    ]
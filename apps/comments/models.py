@@ -9,3 +9,6 @@ class Comment(models.Model):
     content = models.TextField()
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["article", "-created", "-id"], name="comment_article_created_idx")]  # Pages
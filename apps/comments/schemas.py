@@ -1,6 +1,8 @@
 from datetime import datetime
+from typing import Self
 
-from accounts.schemas import ProfileSchema
+from accounts.schemas import AuthorSchema, ProfileSchema
+from django.http import HttpRequest
 from ninja import Field, ModelSchema, Schema
 from pydantic import field_validator
 
@@ -34,6 +36,17 @@ class CommentOutSchema(ModelSchema):
         model = Comment
         fields = ["id"]
 
+    @classmethod
+    def from_trusted(cls, obj: Comment, request: HttpRequest) -> Self:
+        """What `from_orm` would output for a comment loaded by the view, without validating it"""
+        return cls.model_construct(
+            body=obj.content,
+            createdAt=obj.created,
+            updatedAt=obj.updated,
+            author=ProfileSchema.from_trusted(obj.author, request),
+            id=obj.id,
+        )
+
 
 class CommentOutContainerSchema(Schema):
     comment: CommentOutSchema
@@ -41,3 +54,22 @@ class CommentOutContainerSchema(Schema):
 
 class CommentsListOutSchema(Schema):
     comments: list[CommentOutSchema]
+
+
+class CommentsPageOutSchema(CommentsListOutSchema):
+    commentsCount: int
+    nextCursor: str | None
+
+
+class CommentExportSchema(ModelSchema):
+    """Lines of `export_comments`, with the id to resume from"""
+
+    articleId: int = Field(alias="article_id")
+    body: str = Field(alias="content")
+    createdAt: datetime = Field(alias="created")
+    updatedAt: datetime = Field(alias="updated")
+    author: AuthorSchema
+
+    class Meta:
+        model = Comment
+        fields = ["id"]
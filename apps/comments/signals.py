@@ -0,0 +1,55 @@
+"""
+Signal handlers keeping `Article.comments_count` in sync with the comments, and invalidating the cached responses
+that depend on comments. Comments deleted by a cascade from their article aren't counted, and those cascading from
+their author are counted per article, in one update per distinct number of comments.
+"""
+
+from collections import defaultdict
+from typing import Any
+
+from accounts.models import User
+from articles import cache_scopes
+from articles.models import Article
+from django.db.models import Count, F, Model, QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from comments.models import Comment
+from helpers.cache import invalidate
+
+
+@receiver(post_save, sender=Comment)
+def invalidate_saved_comment(sender: type[Comment], instance: Comment, created: bool, **kwargs: Any) -> None:
+    if created:
+        Article.objects.filter(pk=instance.article_id).update(comments_count=F("comments_count") + 1)
+        invalidate(cache_scopes.COUNTS)
+    invalidate(f"comments:{instance.article.slug}")
+
+
+def _origin_model(origin: Model | QuerySet | None) -> type[Model] | None:
+    return origin.model if isinstance(origin, QuerySet) else type(origin) if origin is not None else None
+
+
+@receiver(post_delete, sender=Comment)
+def invalidate_deleted_comment(sender: type[Comment], instance: Comment, origin: Any = None, **kwargs: Any) -> None:
+    """Cascades from deleted articles or users already invalidate, and their comments' articles may be gone"""
+    if _origin_model(origin) in (Article, User):
+        return
+    Article.objects.filter(pk=instance.article_id).update(comments_count=F("comments_count") - 1)
+    invalidate(cache_scopes.COUNTS, f"comments:{instance.article.slug}")
+
+
+@receiver(pre_delete, sender=User)
+def remember_deleted_user_comments(sender: type[User], instance: User, **kwargs: Any) -> None:
+    comments = Comment.objects.filter(author=instance).values("article_id").annotate(n=Count("id")).order_by()
+    instance._comment_counts = {row["article_id"]: row["n"] for row in comments}
+
+
+@receiver(post_delete, sender=User)
+def uncount_deleted_user_comments(sender: type[User], instance: User, **kwargs: Any) -> None:
+    """The articles of this user are gone by now, so only those of others are updated"""
+    article_ids_by_count: dict[int, list[int]] = defaultdict(list)
+    for article_id, count in getattr(instance, "_comment_counts", {}).items():
+        article_ids_by_count[count].append(article_id)
+    for count, article_ids in article_ids_by_count.items():
+        Article.objects.filter(pk__in=article_ids).update(comments_count=F("comments_count") - count)
@@ -1,15 +1,23 @@
 import re
+from json import loads
 from unittest import mock
 
+from articles.api import router as articles_router
 from articles.models import Article
+from articles.schemas import ArticleListCountsOutSchema
 from django.contrib.auth import get_user_model
-from django.test import TestCase
-from ninja.testing import TestClient
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
 from parameterized import parameterized
 
 from comments.api import router
 from comments.models import Comment
+from comments.schemas import CommentOutSchema
 from helpers.jwt_utils import create_jwt_token
+from helpers.projection import project
+from helpers.testing import TestClient
 
 User = get_user_model()
 
@@ -86,6 +94,63 @@ class CommentViewTestCase(TestCase):
         self._valid_timestamps_in_output_dict(response.data["comments"][0])
         self._valid_timestamps_in_output_dict(response.data["comments"][1])
 
+    def test_get_comments_list_not_modified(self):
+        url = f"/articles/{self.article_0.slug}/comments"
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, headers={"IF-NONE-MATCH": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    @parameterized.expand(((0,), (1,), (2,)))
+    def test_get_comments_list_modified(self, change):
+        url = f"/articles/{self.article_0.slug}/comments"
+        etag = self.client.get(url)["ETag"]
+        if change == 0:
+            self.comment_0.delete()
+        elif change == 1:
+            self.user_1.followers.add(self.user_0)
+        else:
+            User.objects.filter(pk=self.user_1.pk).update(bio="New bio")
+        response = self.client.get(url, headers={"IF-NONE-MATCH": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_get_comments_page(self):
+        url = f"/articles/{self.article_0.slug}/comments"
+        extra = Comment.objects.create(article=self.article_0, author=self.user_1, content="comment 4 content")
+        response = self.client.get(url, query_params={"limit": 2})
+        self.assertEqual([c["id"] for c in response.data["comments"]], [extra.id, self.comment_1.id])
+        self.assertEqual(response.data["commentsCount"], 3)
+        self._valid_timestamps_in_output_dict(response.data["comments"][0])
+        response = self.client.get(url, query_params={"limit": 2, "cursor": response.data["nextCursor"]})
+        self.assertEqual(response.data, {"comments": [mock.ANY], "commentsCount": 3, "nextCursor": None})
+        self.assertEqual(response.data["comments"][0]["id"], self.comment_0.id)
+        self.assertEqual(len(self.client.get(url, query_params={"cursor": ""}).data["comments"]), 3)
+        self.assertEqual(self.client.get(url, query_params={"cursor": "invalid"}).status_code, 422)
+
+    def test_get_comments_page_not_modified(self):
+        url = f"/articles/{self.article_0.slug}/comments"
+        etag = self.client.get(url, query_params={"limit": 1})["ETag"]
+        response = self.client.get(url, query_params={"limit": 1}, headers={"IF-NONE-MATCH": etag})
+        self.assertEqual(response.status_code, 304)
+        self.comment_0.delete()  # Not on the page, but changes its count
+        response = self.client.get(url, query_params={"limit": 1}, headers={"IF-NONE-MATCH": etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_get_comments_list_cached_for_anonymous_users(self):
+        cache.clear()
+        anonymous_client = TestClient(router)
+        url = f"/articles/{self.article_0.slug}/comments"
+        response = anonymous_client.get(url)
+        with self.assertNumQueries(0):
+            self.assertEqual(anonymous_client.get(url).content, response.content)
+        self.client.post(url, json={"comment": {"body": "New"}})
+        self.assertEqual(len(anonymous_client.get(url).data["comments"]), 3)
+        self.client.delete(f"{url}/{self.comment_0.id}")
+        self.assertEqual(len(anonymous_client.get(url).data["comments"]), 2)
+        self.article_0.delete()
+        self.assertEqual(anonymous_client.get(url).status_code, 404)
+
     def test_create_comment(self):
         response = self.client.post(
             f"/articles/{self.article_1.slug}/comments",
@@ -145,3 +210,89 @@ class CommentViewTestCase(TestCase):
         response = self.client.delete(f"/articles/{self.article_0.slug}/comments/{self.comment_1.id}")
         self.assertEqual(response.status_code, 401)
         self.assertEqual(self.article_1.comment_set.count(), 2)
+
+    def test_export_comments(self):
+        response = self.client.get("/export/comments")
+        self.assertEqual(response.status_code, 200)
+        lines = [loads(line) for line in response.content.splitlines()]
+        self.assertEqual(
+            [line["id"] for line in lines],
+            [c.id for c in (self.comment_0, self.comment_1, self.comment_2, self.comment_3)],
+        )
+        self.assertEqual(
+            lines[0],
+            {
+                "id": self.comment_0.id,
+                "articleId": self.article_0.id,
+                "body": "comment 0 content",
+                "createdAt": mock.ANY,
+                "updatedAt": mock.ANY,
+                "author": {"username": "testuser1", "bio": None, "image": None},
+            },
+        )
+        self._valid_timestamps_in_output_dict(lines[0])
+        response = self.client.get("/export/comments", query_params={"after": self.comment_1.id})
+        self.assertEqual(
+            [loads(line)["id"] for line in response.content.splitlines()], [self.comment_2.id, self.comment_3.id]
+        )
+
+    def test_trusted_output_is_the_validated_one(self):
+        self.user_1.bio = "Bio"
+        self.user_1.save()
+        self.user_1.followers.add(self.user_0)
+        request = RequestFactory().get("/")
+        request.user = self.user_0
+        comments = list(project(Comment.objects.order_by("id"), CommentOutSchema))
+        self.assertEqual(
+            [CommentOutSchema.from_orm(c, context={"request": request}).model_dump() for c in comments],
+            [CommentOutSchema.from_trusted(c, request).model_dump() for c in comments],
+        )
+        self.assertEqual(CommentOutSchema.from_trusted(comments[0], request).author.following, True)
+
+    def test_comments_count(self):
+        self.assertEqual(Article.objects.get(pk=self.article_0.pk).comments_count, 2)
+        url = f"/articles/{self.article_0.slug}/comments"
+        self.client.post(url, json={"comment": {"body": "New"}})
+        self.client.delete(f"{url}/{self.comment_0.id}")
+        self.comment_1.content = "Edited"
+        self.comment_1.save()
+        self.assertEqual(Article.objects.get(pk=self.article_0.pk).comments_count, 2)
+        self.user_1.delete()  # Cascades to comment 3, the other deleted user's comment on article 0 being gone
+        self.assertEqual(list(Article.objects.values_list("comments_count", flat=True)), [2])
+
+    def test_comments_count_of_cascades(self):
+        def count_updates(context):
+            return sum(q["sql"].startswith("UPDATE") and "comments_count" in q["sql"] for q in context.captured_queries)
+
+        for i in range(3):
+            Comment.objects.create(article=self.article_0, author=self.user_1, content=f"more {i}")
+            Comment.objects.create(article=self.article_1, author=self.user_0, content=f"more {i}")
+        with CaptureQueriesContext(connection) as context:
+            self.article_1.delete()
+        self.assertEqual(count_updates(context), 0)
+        with CaptureQueriesContext(connection) as context:
+            self.user_1.delete()
+        self.assertEqual(count_updates(context), 1)  # One per distinct number of comments, for all their articles
+        self.assertEqual(Article.objects.get(pk=self.article_0.pk).comments_count, 1)
+
+    def test_comments_only_invalidate_the_lists_with_counts(self):
+        cache.clear()
+        articles_client = TestClient(articles_router)
+        before = articles_client.get("/articles").data, articles_client.get("/articles?counts=true").data
+        Comment.objects.create(article=self.article_0, author=self.user_1, content="New")
+        self.assertEqual(articles_client.get("/articles").data, before[0])
+        counts = articles_client.get("/articles?counts=true").data["articles"]
+        self.assertEqual([(a["slug"], a["commentsCount"]) for a in counts], [("title-1", 2), ("title-0", 3)])
+
+    def test_list_articles_with_comments_count(self):
+        articles_client = TestClient(articles_router)
+        articles = articles_client.get("/articles", query_params={"counts": True}).data["articles"]
+        self.assertEqual([(a["slug"], a["commentsCount"]) for a in articles], [("title-1", 2), ("title-0", 2)])
+        self.assertNotIn("commentsCount", articles_client.get("/articles").data["articles"][0])
+        request = RequestFactory().get("/")
+        request.user = self.user_0
+        articles = list(project(Article.objects.order_by("id"), ArticleListCountsOutSchema))
+        self.assertEqual(
+            [ArticleListCountsOutSchema.from_orm(a, context={"request": request}).model_dump() for a in articles],
+            [ArticleListCountsOutSchema.from_trusted(a, request).model_dump() for a in articles],
+        )
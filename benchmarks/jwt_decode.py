@@ -0,0 +1,42 @@
+"""
+Decoding of the token of each authenticated request, by verifying it every time and through the cache of verified
+tokens, that only verifies a token the first time it is seen. Run with `make bench`.
+"""
+
+import os
+import sys
+import time
+import timeit
+from pathlib import Path
+
+import django
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+django.setup()
+
+from jwt_ninja.cryptography import generate_jwt  # noqa: E402
+from jwt_ninja.types import JWTPayload  # noqa: E402
+
+from helpers.jwt_utils import _decode, decoded_tokens  # noqa: E402
+
+SESSIONS = 100
+NUMBER = 20000
+
+
+def main() -> None:
+    exp = int(time.time()) + 3600
+    tokens = [
+        generate_jwt(JWTPayload(user_id=i, type="access", exp=exp, session_id=f"session-{i}")) for i in range(SESSIONS)
+    ]
+    requests = [tokens[i % SESSIONS] for i in range(NUMBER)]
+    timings = {}
+    for name, decode in (("verify", _decode), ("cached", decoded_tokens.decode)):
+        runs = timeit.repeat(lambda d=decode: [d(token) for token in requests], number=1, repeat=5)
+        timings[name] = min(runs) / NUMBER
+        print(f"{name:>6}: {timings[name] * 1e6:8.2f} µs per request, {SESSIONS} sessions")
+    print(f"hit rate: {decoded_tokens.hit_rate:.1%}, speedup: {timings['verify'] / timings['cached']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Rendering of a page of 100 articles, shaped like the output of `list_articles`, by the stdlib renderer of Django
+Ninja and by the orjson one of the API. Run with `make bench`.
+"""
+
+import os
+import sys
+import timeit
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+import django
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+django.setup()
+
+from ninja.renderers import JSONRenderer  # noqa: E402
+
+from helpers.renderers import ORJSONRenderer  # noqa: E402
+
+PAGE_SIZE = 100
+NUMBER = 200
+
+
+def page() -> dict:
+    start = datetime(2024, 1, 1, tzinfo=UTC)
+    articles = [
+        {
+            "slug": f"article-{i}",
+            "title": f"Article {i}",
+            "description": "Some summary of the article, of a typical length for a list.",
+            "createdAt": start + timedelta(minutes=i, microseconds=123456),
+            "updatedAt": start + timedelta(hours=i, microseconds=654321),
+            "favorited": i % 3 == 0,
+            "favoritesCount": i * 7,
+            "author": {"username": f"author{i % 10}", "bio": None, "image": None, "following": i % 2 == 0},
+            "tagList": ["django", "ninja", f"tag{i % 5}"],
+        }
+        for i in range(PAGE_SIZE)
+    ]
+    return {"articles": articles, "articlesCount": 12345}
+
+
+def main() -> None:
+    data = page()
+    timings = {}
+    for name, renderer in (("json", JSONRenderer()), ("orjson", ORJSONRenderer())):
+        runs = timeit.repeat(lambda r=renderer: r.render(None, data, response_status=200), number=NUMBER, repeat=5)
+        timings[name] = min(runs) / NUMBER
+        print(f"{name:>6}: {timings[name] * 1e6:8.1f} µs per page of {PAGE_SIZE} articles")
+    print(f"speedup: {timings['json'] / timings['orjson']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
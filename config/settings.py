@@ -153,3 +153,57 @@ JWT_NINJA = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=7),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
 }
+
+
+# API
+# Responses are rendered and bodies parsed with orjson, set ORJSON=False to fall back to the stdlib json module.
+ORJSON = str(getenv("ORJSON", True)).lower() == "true"
+
+
+# Personal feed
+# Articles are pushed to the timeline of each follower of their author, unless that author has more followers than
+# this, in which case their articles are pulled when reading the feed instead. 0 disables the fan-out entirely.
+FEED_FANOUT_MAX_FOLLOWERS = int(getenv("FEED_FANOUT_MAX_FOLLOWERS", 1000))
+
+
+# Caches
+# Responses to anonymous users are cached in-process by default, evicting the least recently used entries.
+# Set CACHE_URL to a Redis URL (needs the `redis` package) to share them between workers instead.
+CACHE_URL = getenv("CACHE_URL")
+CACHES = {
+    "default": (
+        {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": CACHE_URL}
+        if CACHE_URL
+        else {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "OPTIONS": {"MAX_ENTRIES": int(getenv("CACHE_MAX_ENTRIES", 10000))},
+        }
+    )
+}
+RESPONSE_CACHE_TIMEOUT = int(getenv("RESPONSE_CACHE_TIMEOUT", 600))  # Writes invalidate entries, this is a safety net
+
+# The session and user of each token are cached for AUTH_CACHE_TIMEOUT seconds, 0 disabling it, in-process by default.
+# Writes only drop the entries of their own process then, set AUTH_CACHE_URL to a Redis URL to share them instead.
+AUTH_CACHE_URL = getenv("AUTH_CACHE_URL")
+CACHES["auth"] = (
+    {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": AUTH_CACHE_URL}
+    if AUTH_CACHE_URL
+    else {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "auth",
+        "OPTIONS": {"MAX_ENTRIES": int(getenv("AUTH_CACHE_MAX_ENTRIES", 10000))},
+    }
+)
+AUTH_CACHE_TIMEOUT = int(getenv("AUTH_CACHE_TIMEOUT", 30))
+JWT_DECODE_CACHE_SIZE = int(getenv("JWT_DECODE_CACHE_SIZE", 4096))  # Verified tokens kept per process, 0 disables it
+
+# With JWT_STATELESS, tokens are trusted on their signature and expiry without reading their session, and checked
+# against the revoked sessions, reloaded by each process every JWT_REVOCATION_REFRESH_SECONDS. Users are still read,
+# through the auth cache, so authenticating a token does no I/O while its entry is cached.
+JWT_STATELESS = str(getenv("JWT_STATELESS", False)).lower() == "true"
+JWT_REVOCATION_REFRESH_SECONDS = int(getenv("JWT_REVOCATION_REFRESH_SECONDS", 10))
+
+
+# Exports
+# NDJSON exports read this many rows per round trip, through a server-side cursor on PostgreSQL.
+EXPORT_CHUNK_SIZE = int(getenv("EXPORT_CHUNK_SIZE", 2000))
@@ -24,10 +24,11 @@ from ninja import NinjaAPI
 from ninja.errors import AuthorizationError, HttpError, ValidationError
 
 from helpers.exceptions import ResourceNotFound
+from helpers.renderers import ORJSONParser, ORJSONRenderer
 
 api_prefix = "api"
 
-api = NinjaAPI()
+api = NinjaAPI(renderer=ORJSONRenderer(), parser=ORJSONParser()) if settings.ORJSON else NinjaAPI()
 
 
 @api.exception_handler(ValidationError)
@@ -75,6 +76,7 @@ def http_error_handler(request: HttpRequest, exc: HttpError) -> HttpResponse:
 api.add_router(f"/{api_prefix}", "accounts.api.router")
 api.add_router(f"/{api_prefix}", "articles.api.router")
 api.add_router(f"/{api_prefix}", "comments.api.router")
+api.add_router("/auth", "accounts.auth_api.router")  # Before the routes it overrides
 api.add_router("/auth", "jwt_ninja.api.router")
 
 urlpatterns = [
@@ -0,0 +1,135 @@
+"""
+Response cache for the routes that return the same bytes to every anonymous user, on the `default` cache backend.
+Entries are keyed by path, normalized query params, and the current generation of each scope the response depends on.
+Writes `invalidate` their scopes by moving these generations, so that older entries are never read again and are left
+to be evicted, the TTL being only a safety net.
+"""
+
+import hashlib
+import inspect
+import uuid
+from collections.abc import Callable, Iterable
+from functools import wraps
+from itertools import chain
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpRequest, HttpResponse
+from django.http.response import HttpResponseBase
+from django.utils.cache import get_conditional_response
+
+
+def _generation_keys(scopes: tuple[str, ...]) -> list[str]:
+    return [f"generation:{scope}" for scope in scopes]
+
+
+def _new_generations(keys: list[str]) -> dict[str, str]:
+    """Random rather than incremented, so that an evicted generation can't come back to a value already used"""
+    return {key: uuid.uuid4().hex for key in keys}
+
+
+def generations(scopes: tuple[str, ...]) -> list[str]:
+    keys = _generation_keys(scopes)
+    found = cache.get_many(keys)
+    if missing := _new_generations([key for key in keys if key not in found]):
+        cache.set_many(missing, timeout=None)
+    return [found.get(key) or missing[key] for key in keys]
+
+
+async def agenerations(scopes: tuple[str, ...]) -> list[str]:
+    keys = _generation_keys(scopes)
+    found = await cache.aget_many(keys)
+    if missing := _new_generations([key for key in keys if key not in found]):
+        await cache.aset_many(missing, timeout=None)
+    return [found.get(key) or missing[key] for key in keys]
+
+
+def invalidate(*scopes: str) -> None:
+    """
+    Bumped right away so that nothing cached before is read anymore, and again on commit to also drop what other
+    connections cached in the meantime, as they were still reading the data from before this transaction.
+    """
+
+    def bump() -> None:
+        cache.set_many(_new_generations(_generation_keys(scopes)), timeout=None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def _is_anonymous(request: HttpRequest) -> bool:
+    user = getattr(request, "user", None)
+    return "Authorization" not in request.headers and not (user and user.is_authenticated)
+
+
+async def _ais_anonymous(request: HttpRequest) -> bool:
+    """`_is_anonymous` without evaluating the lazy `request.user` of the auth middleware, which would query"""
+    if "Authorization" in request.headers:
+        return False
+    user = await request.auser() if "auser" in request.__dict__ else getattr(request, "user", None)
+    return not (user and user.is_authenticated)
+
+
+def _response_key(request: HttpRequest, generations: list[str]) -> str:
+    query = sorted((key, request.GET.getlist(key)) for key in request.GET)
+    key_parts = repr((request.path, query, generations)).encode()
+    return f"response:{hashlib.blake2b(key_parts, digest_size=16).hexdigest()}"
+
+
+def _cached_response(request: HttpRequest, entry: tuple[bytes, dict[str, str]]) -> HttpResponse:
+    content, headers = entry
+    response = HttpResponse(content, headers=headers)
+    return get_conditional_response(request, etag=response.get("ETag"), response=response)
+
+
+def _entry(response: HttpResponseBase) -> tuple[bytes, dict[str, str]] | None:
+    if response.status_code != 200 or response.streaming:
+        return None
+    return response.content, dict(response.items())
+
+
+def cache_anonymous(*scopes: str | Callable[..., str | Iterable[str]]) -> Callable:
+    """
+    Cache the successful responses of a Ninja route to anonymous users, to use with `ninja.decorators.decorate_view`.
+    Scopes may be callables, that get the request and its path params, and return one scope or several.
+    Async routes use the async cache API.
+    """
+
+    def names(request: HttpRequest, kwargs: dict[str, Any]) -> tuple[str, ...]:
+        resolved = (scope(request, **kwargs) if callable(scope) else scope for scope in scopes)
+        return tuple(chain.from_iterable([scope] if isinstance(scope, str) else scope for scope in resolved))
+
+    def decorator(run: Callable[..., HttpResponseBase]) -> Callable[..., HttpResponseBase]:
+        if inspect.iscoroutinefunction(run):
+
+            @wraps(run)
+            async def async_wrapper(request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponseBase:
+                if request.method != "GET" or not await _ais_anonymous(request):
+                    return await run(request, *args, **kwargs)
+                key = _response_key(request, await agenerations(names(request, kwargs)))
+                if (entry := await cache.aget(key)) is not None:
+                    return _cached_response(request, entry)
+                response = await run(request, *args, **kwargs)
+                if (entry := _entry(response)) is not None:
+                    await cache.aset(key, entry, settings.RESPONSE_CACHE_TIMEOUT)
+                return response
+
+            return async_wrapper
+
+        @wraps(run)
+        def wrapper(request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponseBase:
+            if request.method != "GET" or not _is_anonymous(request):
+                return run(request, *args, **kwargs)
+            key = _response_key(request, generations(names(request, kwargs)))
+            if (entry := cache.get(key)) is not None:
+                return _cached_response(request, entry)
+            response = run(request, *args, **kwargs)
+            if (entry := _entry(response)) is not None:
+                cache.set(key, entry, settings.RESPONSE_CACHE_TIMEOUT)
+            return response
+
+        return wrapper
+
+    return decorator
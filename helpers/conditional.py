@@ -0,0 +1,27 @@
+"""
+Conditional GET support, so that clients polling a resource get a `304 Not Modified` instead of the same body again.
+Views compute the ETag from cheap queries, and only load and serialize the full representation on a miss.
+"""
+
+import hashlib
+
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+
+
+def make_etag(*parts: object) -> str:
+    """Strong ETag over everything the representation depends on, including what the viewer relates to"""
+    return quote_etag(hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest())
+
+
+def not_modified(request: HttpRequest, response: HttpResponse, etag: str) -> HttpResponse | None:
+    """
+    Set the ETag on the temporal `response` of a Ninja view, then return a 304 (or 412) response if the request
+    preconditions match it, that the view returns as is. There is no `Last-Modified`, as the representations depend on
+    the viewer and on related rows whose changes don't move the timestamps of the resource.
+    """
+    response["ETag"] = etag
+    patch_vary_headers(response, ["Authorization"])  # As the viewer's favorites and follows are part of the body
+    conditional_response = get_conditional_response(request, etag=etag, response=response)
+    return conditional_response if conditional_response is not response else None
@@ -19,6 +19,14 @@ def get_or_404(model_or_qs: type[Model] | QuerySet, resource: str, **kwargs) ->
         raise ResourceNotFound(resource) from None
 
 
+async def aget_or_404(model_or_qs: type[Model] | QuerySet, resource: str, **kwargs) -> Model:
+    queryset = model_or_qs._default_manager.all() if isinstance(model_or_qs, type) else model_or_qs
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise ResourceNotFound(resource) from None
+
+
 def clean_integrity_error(error: Exception) -> str | None:
     """Helper to convert an IntegrityError from psycopg2/sqlite3 to a field name string"""
     try:
@@ -0,0 +1,48 @@
+"""
+NDJSON exports, streamed so that memory stays flat whatever the number of rows, with one JSON object per line.
+Rows are read in ascending id order through `QuerySet.iterator`, a server-side cursor on PostgreSQL, so that an
+interrupted export is resumed by passing the id of the last line received as `after`.
+Under ASGI, Django would read a sync iterator whole before sending anything, so the lines are then streamed by an async
+iterator, reading and encoding each chunk of them in the thread of the sync code.
+"""
+
+from collections.abc import AsyncIterator, Iterator
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import QuerySet
+from django.http import HttpRequest, StreamingHttpResponse
+from ninja import Schema
+
+from helpers.renderers import dumps
+
+
+def ndjson_lines(queryset: QuerySet, schema: type[Schema], after: int | None = None) -> Iterator[bytes]:
+    """Lines of the rows of `queryset` with an id past `after`, output as by `schema` with the API encoder"""
+    queryset = queryset.order_by("id")
+    queryset = queryset.filter(id__gt=after) if after is not None else queryset
+    for row in queryset.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):  # Also applies to its prefetches
+        yield dumps(schema.from_orm(row).model_dump()) + b"\n"
+
+
+async def ndjson_chunks(lines: Iterator[bytes]) -> AsyncIterator[bytes]:
+    """`lines` joined by chunks of `EXPORT_CHUNK_SIZE`, each read from the database and encoded in a thread"""
+
+    def next_chunk() -> bytes:
+        return b"".join(islice(lines, settings.EXPORT_CHUNK_SIZE))
+
+    try:
+        while chunk := await sync_to_async(next_chunk)():
+            yield chunk
+    finally:
+        await sync_to_async(lines.close)()  # Also when the client went away, to release the cursor
+
+
+def ndjson_response(
+    request: HttpRequest, queryset: QuerySet, schema: type[Schema], after: int | None = None
+) -> StreamingHttpResponse:
+    lines = ndjson_lines(queryset, schema, after)
+    content = ndjson_chunks(lines) if isinstance(request, ASGIRequest) else lines
+    return StreamingHttpResponse(content, content_type="application/x-ndjson")
@@ -1,8 +1,28 @@
+"""
+Token authentication of the API. Decoding a token is local, and only done once per token, the payloads of verified
+tokens being kept in `decoded_tokens` until they expire. The session and user of a token are read from the database,
+so both are cached together per session for `AUTH_CACHE_TIMEOUT` seconds, in the `auth` cache. The signal handlers of
+`accounts.signals` drop these entries when a session or a user is saved or deleted, and an expired session is still
+rejected from its cached `expired_at`. Revocations through `QuerySet.update`, as done by
+`Session.invalidate_all_user_sessions`, don't send signals: their callers must `forget_sessions` themselves, as the
+`logout/all/` route of `accounts.auth_api` does.
+With `JWT_STATELESS`, sessions are not read at all, tokens of revoked sessions being rejected by `revoked_sessions`.
+"""
+
 import dataclasses
+import hashlib
+import threading
 import time
+from collections import OrderedDict
+from collections.abc import Iterable
 
+from accounts.viewer import Viewer
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import QuerySet
 from django.http import HttpRequest
 from django.utils import timezone
 from jwt_ninja.cryptography import decode_jwt, generate_jwt
@@ -17,6 +37,8 @@ from jwt_ninja.settings import jwt_settings
 from jwt_ninja.types import JWTPayload
 from ninja.security import HttpBearer
 
+from helpers.revocations import revoked_sessions
+
 User = get_user_model()
 
 
@@ -31,6 +53,136 @@ class AuthedRequest(HttpRequest):
     auth: AuthDetails
 
 
+def set_request_user(request: HttpRequest, user: User | AnonymousUser) -> User | AnonymousUser:
+    """Also sets the `Viewer` through which schemas resolve what this user follows and favorited"""
+    request.user = user
+    request.viewer = Viewer(user)
+    return user
+
+
+def _bearer_token(request: HttpRequest) -> str | None:
+    """The token of the Authorization header, accepting the 'Token' prefix in addition to 'Bearer'"""
+    auth_value = request.headers.get("Authorization") or ""
+    for prefix in ("Token ", "Bearer "):
+        if auth_value.startswith(prefix):
+            return auth_value[len(prefix) :]
+    return None
+
+
+def _decode(token: str) -> JWTPayload:
+    try:
+        return decode_jwt(token, JWTPayload)
+    except JWTExpiredError:
+        raise APIError("expired_token", 401) from None
+    except (JWTInvalidPayloadFormat, JWTInvalidTokenError):
+        raise APIError("invalid_token", 401) from None
+
+
+class DecodedTokens:
+    """
+    Bounded LRU of the payloads of verified tokens, keyed by the SHA-256 of the token, so that the signature of a token
+    used again is not verified again. A payload is only returned until its `exp`, as `decode_jwt` would then reject it.
+    Holds up to `JWT_DECODE_CACHE_SIZE` payloads, 0 disabling it. `hits` and `misses` count the lookups.
+    """
+
+    def __init__(self) -> None:
+        self._payloads: OrderedDict[bytes, JWTPayload] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def decode(self, token: str) -> JWTPayload:
+        if not (size := settings.JWT_DECODE_CACHE_SIZE):
+            return _decode(token)
+        key = hashlib.sha256(token.encode()).digest()
+        with self._lock:
+            if (payload := self._payloads.get(key)) is not None and payload.exp > time.time():
+                self._payloads.move_to_end(key)
+                self.hits += 1
+                return payload
+            self._payloads.pop(key, None)
+            self.misses += 1
+        payload = _decode(token)
+        with self._lock:
+            self._payloads[key] = payload
+            while len(self._payloads) > size:
+                self._payloads.popitem(last=False)
+        return payload
+
+    def clear(self) -> None:
+        with self._lock:
+            self._payloads.clear()
+            self.hits = self.misses = 0
+
+
+decoded_tokens = DecodedTokens()
+
+
+def _check_session(session: Session) -> Session:
+    if session.expired_at and session.expired_at < timezone.now():
+        raise APIError("session_expired", 401)
+    return session
+
+
+def _session(payload: JWTPayload) -> Session:
+    if settings.JWT_STATELESS:
+        return Session(id=payload.session_id, user_id=payload.user_id)  # Trusted from the token, without reading it
+    try:
+        return _check_session(Session.objects.get(id=payload.session_id))
+    except Session.DoesNotExist:
+        raise APIError("session_not_found", 401) from None
+
+
+async def _asession(payload: JWTPayload) -> Session:
+    if settings.JWT_STATELESS:
+        return Session(id=payload.session_id, user_id=payload.user_id)
+    try:
+        return _check_session(await Session.objects.aget(id=payload.session_id))
+    except Session.DoesNotExist:
+        raise APIError("session_not_found", 401) from None
+
+
+def _check_revocation(payload: JWTPayload) -> None:
+    if payload.session_id in revoked_sessions:
+        raise APIError("session_expired", 401)
+
+
+def _auth_key(session_id: str) -> str:
+    return f"auth:{session_id}"
+
+
+def _cached(payload: JWTPayload, details: AuthDetails | None) -> AuthDetails | None:
+    """The cached details, if they are still those of the user of the token"""
+    if details is None or details.user.id != payload.user_id:
+        return None
+    _check_session(details.session)
+    return details
+
+
+def forget_sessions(*session_ids: str) -> None:
+    """
+    Drop the cached auth of these sessions right away, and again on commit, as other requests could cache what they
+    read before this transaction in the meantime.
+    """
+    keys = [_auth_key(session_id) for session_id in session_ids]
+
+    def forget() -> None:
+        caches["auth"].delete_many(keys)
+
+    if keys:
+        forget()
+        transaction.on_commit(forget)
+
+
+def forget_users(user_ids: Iterable[int] | QuerySet) -> None:
+    """`forget_sessions` of all the active sessions of these users"""
+    forget_sessions(*Session.objects.active().filter(user__in=user_ids).values_list("id", flat=True))
+
+
 class TokenAuth(HttpBearer):
     """Custom JWT authentication class that accepts 'Token' prefix in addition to 'Bearer'"""
 
@@ -38,56 +190,39 @@ class TokenAuth(HttpBearer):
         self.pass_even = pass_even
         super().__init__(*args, **kwargs)
 
-    def __call__(self, request: HttpRequest) -> AuthDetails | None:
-        headers = request.headers
-        auth_value = headers.get("Authorization")
-        if not auth_value:
-            if self.pass_even:
-                # For pass_even routes, we allow unauthenticated access
-                # Set request.user to AnonymousUser so code can handle both cases
-                request.user = AnonymousUser()
-                return request.user
-            return None
-
-        # Handle both "Token" and "Bearer" prefixes
-        if auth_value.startswith("Token "):
-            token = auth_value[6:]  # Remove "Token " prefix
-        elif auth_value.startswith("Bearer "):
-            token = auth_value[7:]  # Remove "Bearer " prefix
-        else:
-            if self.pass_even:
-                request.user = AnonymousUser()
-                return request.user
-            return None
+    def _anonymous(self, request: HttpRequest) -> AnonymousUser | None:
+        # For pass_even routes, we allow unauthenticated access
+        # Set request.user to AnonymousUser so code can handle both cases
+        return set_request_user(request, AnonymousUser()) if self.pass_even else None
+
+    def _authenticated(self, request: HttpRequest, auth_details: AuthDetails | None) -> AuthDetails | None:
+        if auth_details:
+            # Set request.user for backward compatibility
+            set_request_user(request, auth_details.user)
+        return auth_details
 
+    def __call__(self, request: HttpRequest) -> AuthDetails | AnonymousUser | None:
+        if (token := _bearer_token(request)) is None:
+            return self._anonymous(request)
         try:
-            auth_details = self.authenticate(request, token)
-            if auth_details:
-                # Set request.user for backward compatibility
-                request.user = auth_details.user
-            return auth_details
+            return self._authenticated(request, self.authenticate(request, token))
         except APIError:
             if self.pass_even:
                 # On authentication failure, allow unauthenticated access
-                request.user = AnonymousUser()
-                return request.user
+                return self._anonymous(request)
             raise
 
     def authenticate(self, request: HttpRequest, token: str) -> AuthDetails | None:
-        try:
-            payload = decode_jwt(token, JWTPayload)
-        except JWTExpiredError:
-            raise APIError("expired_token", 401) from None
-        except (JWTInvalidPayloadFormat, JWTInvalidTokenError):
-            raise APIError("invalid_token", 401) from None
+        payload = decoded_tokens.decode(token)
+        if settings.JWT_STATELESS:
+            revoked_sessions.refresh_if_stale()
+            _check_revocation(payload)
+        if timeout := settings.AUTH_CACHE_TIMEOUT:
+            if details := _cached(payload, caches["auth"].get(_auth_key(payload.session_id))):
+                return details
 
         # Validate the Session
-        try:
-            session = Session.objects.get(id=payload.session_id)
-        except Session.DoesNotExist:
-            raise APIError("session_not_found", 401) from None
-        if session.expired_at and session.expired_at < timezone.now():
-            raise APIError("session_expired", 401)
+        session = _session(payload)
 
         # Validate the user
         try:
@@ -95,7 +230,42 @@ class TokenAuth(HttpBearer):
         except User.DoesNotExist:
             raise APIError("invalid_user", 401) from None
 
-        return AuthDetails(user=user, session=session)
+        details = AuthDetails(user=user, session=session)
+        if timeout:
+            caches["auth"].set(_auth_key(session.id), details, timeout)
+        return details
+
+
+class AsyncTokenAuth(TokenAuth):
+    """`TokenAuth` for async views, looking up the session and the user with the async ORM"""
+
+    async def __call__(self, request: HttpRequest) -> AuthDetails | AnonymousUser | None:
+        if (token := _bearer_token(request)) is None:
+            return self._anonymous(request)
+        try:
+            return self._authenticated(request, await self.authenticate(request, token))
+        except APIError:
+            if self.pass_even:
+                return self._anonymous(request)
+            raise
+
+    async def authenticate(self, request: HttpRequest, token: str) -> AuthDetails | None:
+        payload = decoded_tokens.decode(token)
+        if settings.JWT_STATELESS:
+            await revoked_sessions.arefresh_if_stale()
+            _check_revocation(payload)
+        if timeout := settings.AUTH_CACHE_TIMEOUT:
+            if details := _cached(payload, await caches["auth"].aget(_auth_key(payload.session_id))):
+                return details
+        session = await _asession(payload)
+        try:
+            user = await User.objects.aget(id=payload.user_id, is_active=True)
+        except User.DoesNotExist:
+            raise APIError("invalid_user", 401) from None
+        details = AuthDetails(user=user, session=session)
+        if timeout:
+            await caches["auth"].aset(_auth_key(session.id), details, timeout)
+        return details
 
 
 def create_jwt_token(user, request=None):
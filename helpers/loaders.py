@@ -0,0 +1,61 @@
+"""
+Request-scoped batch loading for schema resolvers, so that serializing a page costs one `IN` query per relation
+instead of one query per item. Views `prime` the keys of the whole page, then the first `load` from a resolver
+fetches all of them at once, and the next ones are read from memory.
+"""
+
+from collections.abc import Awaitable, Callable, Iterable
+from typing import Any, Generic, TypeVar
+
+from django.http import HttpRequest
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+class BatchLoader(Generic[K, V]):
+    """
+    Async views can't query from resolvers, so they `aload_pending` once primed, with `abatch_load`, before serializing.
+    """
+
+    def __init__(
+        self,
+        batch_load: Callable[[set[K]], dict[K, V]],
+        default: V,
+        abatch_load: Callable[[set[K]], Awaitable[dict[K, V]]] | None = None,
+    ) -> None:
+        self.batch_load = batch_load  # Keys missing from its result get the `default` value
+        self.abatch_load = abatch_load
+        self.default = default
+        self._pending: set[K] = set()
+        self._loaded: dict[K, V] = {}
+
+    def prime(self, keys: Iterable[K]) -> None:
+        self._pending.update(key for key in keys if key not in self._loaded)
+
+    def _store(self, keys: set[K], values: dict[K, V]) -> None:
+        self._loaded.update((k, values.get(k, self.default)) for k in keys)
+
+    def load(self, key: K) -> V:
+        if key not in self._loaded:
+            keys, self._pending = {key, *self._pending}, set()
+            self._store(keys, self.batch_load(keys))
+        return self._loaded[key]
+
+    async def aload_pending(self) -> None:
+        if self._pending:
+            keys, self._pending = self._pending, set()
+            self._store(keys, await self.abatch_load(keys))
+
+
+def get_loader(request: HttpRequest, factory: Callable[[HttpRequest], BatchLoader]) -> BatchLoader:
+    """The loader built by `factory` for this request, created on first use"""
+    loaders = request.__dict__.setdefault("_batch_loaders", {})
+    if factory not in loaders:
+        loaders[factory] = factory(request)
+    return loaders[factory]
+
+
+def request_from(context: dict[str, Any] | None) -> HttpRequest | None:
+    """The request passed to `Schema.from_orm` through its `context`, if any"""
+    return context.get("request") if context else None
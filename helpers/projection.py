@@ -0,0 +1,65 @@
+from collections.abc import Iterable
+from typing import get_args
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Field, Model, Prefetch, QuerySet
+from pydantic import BaseModel
+
+
+def _model_field(model: type[Model], names: Iterable[str | None]) -> Field | None:
+    for name in names:
+        if name:
+            try:
+                return model._meta.get_field(name)
+            except FieldDoesNotExist:
+                pass
+    return None
+
+
+def _nested_schema(annotation: object) -> type[BaseModel] | None:
+    """`SomeSchema` for a field annotated as `SomeSchema`, `list[SomeSchema]` or `SomeSchema | None`"""
+    for candidate in (annotation, *get_args(annotation)):
+        if isinstance(candidate, type) and issubclass(candidate, BaseModel):
+            return candidate
+    return None
+
+
+def _projection(
+    model: type[Model], schema: type[BaseModel], prefix: str = ""
+) -> tuple[list[str], list[str], list[Prefetch]]:
+    only: list[str] = []
+    select: list[str] = []
+    prefetch: list[Prefetch] = []
+    for name, field_info in schema.model_fields.items():
+        if field_info.exclude:
+            continue
+        model_field = _model_field(model, (field_info.alias, name))
+        if model_field is None:  # Computed by a resolver, which may need `extra` columns
+            continue
+        nested = _nested_schema(field_info.annotation) if model_field.is_relation else None
+        if nested is None:
+            only.append(f"{prefix}{model_field.name}")
+        elif model_field.many_to_one or model_field.one_to_one:
+            select.append(f"{prefix}{model_field.name}")
+            nested_only, nested_select, nested_prefetch = _projection(
+                model_field.related_model, nested, f"{prefix}{model_field.name}__"
+            )
+            only += nested_only
+            select += nested_select
+            prefetch += nested_prefetch
+        else:
+            related = model_field.related_model.objects.all()
+            back_reference = [model_field.field.name] if model_field.one_to_many else []  # Needed to match the rows
+            related = project(related, nested, extra=back_reference)
+            prefetch.append(Prefetch(f"{prefix}{model_field.name}", queryset=related))
+    return only, select, prefetch
+
+
+def project(queryset: QuerySet, schema: type[BaseModel], extra: Iterable[str] = ()) -> QuerySet:
+    """
+    Only load the columns output by `schema`, joining the relations it nests as schemas, and prefetching the nested
+    lists. Schema fields are matched to model fields by alias, then by name. Fields computed by resolvers are skipped,
+    the columns they read must be passed in `extra`, as well as those needed for anything else than serializing.
+    """
+    only, select, prefetch = _projection(queryset.model, schema)
+    return queryset.select_related(*select).prefetch_related(*prefetch).only(*only, *extra)
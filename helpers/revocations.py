@@ -0,0 +1,82 @@
+"""
+Revocation set of the stateless JWT mode, in which tokens are trusted on their signature and `exp` alone, without
+reading their session. It holds the sessions expired or revoked recently enough for their tokens to still be valid,
+those of deactivated users, and those that expire before the next refresh. They are kept as a sorted array of ids,
+with when each stops being valid, so checking a token is a binary search without I/O.
+The set is reloaded at most every `JWT_REVOCATION_REFRESH_SECONDS`, so a revocation is seen within that delay. Sessions
+already known are kept until their tokens expire, even once purged. A session deleted before a reload is never known.
+jwt_ninja revokes sessions by expiring them, and a deleted user is still rejected by the user lookup.
+"""
+
+import bisect
+import threading
+import time
+from collections.abc import Iterable
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+from jwt_ninja.models import Session
+from jwt_ninja.settings import jwt_settings
+
+
+class RevokedSessions:
+    def __init__(self) -> None:
+        self._entries: tuple[list[str], list[float]] = ([], [])  # Sorted ids, and from when each session is revoked
+        self._loaded_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def __contains__(self, session_id: str) -> bool:
+        ids, revoked_at = self._entries
+        i = bisect.bisect_left(ids, session_id)
+        return i < len(ids) and ids[i] == session_id and revoked_at[i] <= time.time()
+
+    def __len__(self) -> int:
+        return len(self._entries[0])
+
+    def _is_stale(self) -> bool:
+        return time.monotonic() - self._loaded_at >= settings.JWT_REVOCATION_REFRESH_SECONDS
+
+    def _rows(self) -> QuerySet:
+        now = timezone.now()
+        expiring = Q(
+            expired_at__gt=now - timedelta(seconds=jwt_settings.ACCESS_TOKEN_EXPIRE_SECONDS),
+            expired_at__lte=now + timedelta(seconds=settings.JWT_REVOCATION_REFRESH_SECONDS),
+        )
+        deactivated = Q(user__is_active=False) & (Q(expired_at__isnull=True) | Q(expired_at__gt=now))
+        return Session.objects.filter(expiring | deactivated).values_list("id", "expired_at", "user__is_active")
+
+    def _load(self, rows: Iterable[tuple[str, datetime | None, bool]]) -> None:
+        with self._lock:
+            horizon = time.time() - jwt_settings.ACCESS_TOKEN_EXPIRE_SECONDS
+            entries = {i: at for i, at in zip(*self._entries, strict=True) if at > horizon}
+            for session_id, expired_at, is_active in rows:
+                entries[session_id] = expired_at.timestamp() if is_active and expired_at else 0.0
+            ids = sorted(entries)
+            self._entries = (ids, [entries[session_id] for session_id in ids])
+
+    def refresh(self) -> None:
+        """Set as loaded first, so that the requests arriving meanwhile don't reload it too"""
+        self._loaded_at = time.monotonic()
+        self._load(list(self._rows()))
+
+    async def arefresh(self) -> None:
+        self._loaded_at = time.monotonic()
+        self._load([row async for row in self._rows()])
+
+    def refresh_if_stale(self) -> None:
+        if self._is_stale():
+            self.refresh()
+
+    async def arefresh_if_stale(self) -> None:
+        if self._is_stale():
+            await self.arefresh()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries = ([], [])
+            self._loaded_at = float("-inf")
+
+
+revoked_sessions = RevokedSessions()
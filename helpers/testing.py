@@ -0,0 +1,25 @@
+"""
+Test clients for the routers, whichever of their operations are sync or async.
+"""
+
+from collections.abc import Callable
+from inspect import isawaitable
+from typing import Any
+
+from asgiref.sync import async_to_sync
+from ninja import testing
+from ninja.testing.client import NinjaResponse
+
+
+class TestClient(testing.TestClient):
+    """`ninja.testing.TestClient`, also running the async operations, until the end of their response"""
+
+    def _call(self, func: Callable, request: Any, kwargs: dict[str, Any]) -> NinjaResponse:
+        result = func(request, **kwargs)
+        if isawaitable(result):
+
+            async def resolve() -> Any:
+                return await result
+
+            result = async_to_sync(resolve)()
+        return NinjaResponse(result)